@@ -2,6 +2,8 @@ import asyncio
 import traceback
 from typing import Optional
 
+from aioconsole import ainput
+
 from .mcp_client import MCPClient
 from .commands import CommandHandler
 from ..log import logger
@@ -15,8 +17,8 @@ class CLI:
     
     async def start(self) -> None:
         """启动 CLI 界面"""
-        model = self.client.config['models']['selected']
-        base_url = self.client.config['api']['base_url']
+        model = self.client.default_model
+        base_url = self.client.base_url
         
         logger.info("MCP 客户端已启动！")
         logger.info(f"使用模型：{model}")
@@ -35,7 +37,8 @@ class CLI:
         """运行交互式循环"""
         while True:
             try:
-                query = input("\n> ").strip()
+                # 异步读取输入，避免阻塞事件循环（SSE 保活等后台任务可继续运行）
+                query = (await ainput("\n> ")).strip()
                 
                 # 命令处理
                 if query.startswith('!'):
@@ -49,8 +52,15 @@ class CLI:
                 print("正在处理请求，请稍等...")
                 
                 try:
-                    response = await self.client.process_query(query)
-                    print("\n" + response)
+                    if self.client.stream:
+                        # 流式输出：token 到达即打印
+                        print()
+                        async for chunk in self.client.process_query_stream(query):
+                            print(chunk, end="", flush=True)
+                        print()
+                    else:
+                        response = await self.client.process_query(query)
+                        print("\n" + response)
                 except Exception as e:
                     logger.error(f"处理查询时出错: {e}", exc_info=True)
                     print(f"\n错误：{str(e)}")
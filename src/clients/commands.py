@@ -4,6 +4,13 @@ from typing import List, Dict, Any, Callable, Awaitable, Optional
 
 from ..log import logger
 
+# 无参数命令共享的空参数列表（处理器不会修改 args）
+_NO_ARGS: List[str] = []
+
+# !debug 开关取值（哈希查找，lower 只做一次）
+_TRUE_VALUES = frozenset({"on", "true", "1", "yes"})
+_FALSE_VALUES = frozenset({"off", "false", "0", "no"})
+
 class CommandHandler:
     """命令处理器类，处理交互式命令"""
     
@@ -26,12 +33,13 @@ class CommandHandler:
         Args:
             command: 命令字符串（不含前缀！）
         """
-        parts = command.split()
-        cmd = parts[0].lower() if parts else ""
-        args = parts[1:] if len(parts) > 1 else []
-        
-        if cmd in self.commands:
-            await self.commands[cmd](args)
+        # partition 只取第一个 token，比完整 split 更快
+        cmd, _, rest = command.partition(" ")
+        handler = self.commands.get(cmd.lower())
+
+        if handler:
+            # 多数命令不带参数，惰性拆分避免无谓的列表分配
+            await handler(rest.split() if rest else _NO_ARGS)
         else:
             print(f"未知命令：{cmd}")
             print("输入 '!help' 查看可用命令")
@@ -57,7 +65,7 @@ class CommandHandler:
     
     async def cmd_servers(self, args: List[str]) -> None:
         """列出可用服务器命令"""
-        print(f"可用的服务器：{', '.join(self.client.servers.keys())}")
+        print(f"可用的服务器：{self.client._servers_joined}")
         print(f"当前服务器：{self.client.current_server}")
     
     async def cmd_connect(self, args: List[str]) -> None:
@@ -68,31 +76,40 @@ class CommandHandler:
             
         server_name = args[0]
         try:
-            # 创建新的退出栈并关闭旧连接
+            # 在本任务内关闭旧连接后再建新连接：MCP 传输基于 anyio
+            # 任务组，取消作用域必须由进入它的任务退出，
+            # 丢给并行任务关闭会抛 RuntimeError 并泄漏旧连接
             if self.client.connection is not None:
                 logger.info(f"正在断开与服务器 '{self.client.current_server}' 的连接...")
                 old_exit_stack = self.client.exit_stack
                 self.client.connection = None
                 self.client.exit_stack = self.client._create_exit_stack()
-                await old_exit_stack.aclose()
-            
+                try:
+                    await old_exit_stack.aclose()
+                except Exception as e:
+                    logger.warning(f"关闭旧连接时出错: {e}")
+
+            # 显式重连时强制刷新该服务器的工具缓存
+            self.client._tools_by_server.pop(server_name, None)
+
             # 连接到新服务器
             await self.client.connect_to_server(server_name)
             print(f"已连接到服务器：{server_name}")
         except Exception as e:
             print(f"错误：{str(e)}")
-            if self.client.config['system'].get('debug', False):
+            if self.client.debug:
                 traceback.print_exc()
     
     async def cmd_model(self, args: List[str]) -> None:
         """切换模型命令"""
         if not args:
-            print(f"当前模型：{self.client.config['models']['selected']}")
+            print(f"当前模型：{self.client.default_model}")
             return
             
         model = args[0]
         if model in self.client.config['models']['available']:
             self.client.config['models']['selected'] = model
+            self.client.default_model = model
             print(f"已切换到模型：{model}")
         else:
             print(f"未知模型：{model}")
@@ -101,20 +118,23 @@ class CommandHandler:
     async def cmd_models(self, args: List[str]) -> None:
         """列出可用模型命令"""
         print(f"可用的模型：{', '.join(self.client.config['models']['available'])}")
-        print(f"当前模型：{self.client.config['models']['selected']}")
+        print(f"当前模型：{self.client.default_model}")
     
     async def cmd_debug(self, args: List[str]) -> None:
         """切换调试模式命令"""
         if not args:
-            current = self.client.config['system'].get('debug', False)
+            current = self.client.debug
             print(f"调试模式：{'开启' if current else '关闭'}")
             return
             
-        if args[0].lower() in ('on', 'true', '1'):
+        value = args[0].lower()
+        if value in _TRUE_VALUES:
             self.client.config['system']['debug'] = True
+            self.client.debug = True
             print("已开启调试模式")
-        elif args[0].lower() in ('off', 'false', '0'):
+        elif value in _FALSE_VALUES:
             self.client.config['system']['debug'] = False
+            self.client.debug = False
             print("已关闭调试模式")
         else:
             print("无效的参数，请使用 'on' 或 'off'")
\ No newline at end of file
@@ -2,14 +2,20 @@
 MCP 客户端核心类
 提供与 MCP 服务器通信和 LLM 交互的功能
 """
+import asyncio
+import io
 import json
 import re
 import os
 from typing import Optional, Dict, Any, List
 from contextlib import AsyncExitStack
 
-import httpx
-from dotenv import load_dotenv
+# 优先使用 orjson（C 实现），不可用时回退到标准库 json
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 from ..config.config_manager import ConfigManager
 from ..servers.discovery import find_server_instances
@@ -17,8 +23,19 @@ from ..connectors import create_server_connection, ServerConnection
 from ..log import logger
 from ..llm.factory import LLMFactory
 
-# 加载环境变量
-load_dotenv()
+# 加载环境变量（设置 MCP_SKIP_DOTENV=1 可跳过，省去启动时的文件查找）
+if os.environ.get('MCP_SKIP_DOTENV') != '1':
+    from dotenv import load_dotenv
+    load_dotenv()
+
+# 服务器选择指令 (!use_server:服务器名称)，预编译避免每次查询重新解析
+_USE_SERVER_RE = re.compile(r'!use_server:(\S+)\s*')
+
+# Gemini 不支持的 JSON Schema 字段
+_EXCLUDED_SCHEMA_KEYS = frozenset({"$defs", "$ref", "default"})
+
+# 无参数工具共享的空参数 schema（消费方只读不改）
+_EMPTY_PARAMS_SCHEMA: Dict[str, Any] = {"type": "object", "properties": {}, "required": []}
 
 class MCPClient:
     """MCP 客户端核心类，提供与 MCP 服务器的通信和 LLM 交互功能"""
@@ -32,37 +49,81 @@ class MCPClient:
         # 加载配置
         config_manager = ConfigManager()
         self.config = config_manager.load(config_path)
-        
+
+        # 快照热路径上反复访问的配置项，避免每次查询做字典链查找
+        system_cfg = self.config['system']
+        self.debug = bool(system_cfg.get('debug', False))
+        self.stream = bool(system_cfg.get('stream', False))
+        self.system_message = system_cfg.get('message', '')
+        self.timeout = system_cfg.get('timeout', 60.0)
+        self.default_model = self.config['models']['selected']
+        self.base_url = self.config['api']['base_url']
+
         # 初始化会话和客户端对象
         self.connection: Optional[ServerConnection] = None
         self.exit_stack = self._create_exit_stack()
-        self.http_client = httpx.AsyncClient(timeout=self.config['system'].get('timeout', 60.0))
-        
-        # 加载 API 密钥
-        self._setup_api_keys()
+        # httpx 延迟到构造时导入，纯命令路径（!help 等）不必加载
+        import httpx
+        # 共享连接池：复用 TLS/TCP 连接，避免每次请求重新握手
+        self.http_client = httpx.AsyncClient(
+            timeout=self.timeout,
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=60)
+        )
         
+        # API 密钥已由 ConfigManager 从环境变量统一加载
+
         # 发现可用服务器
         self.servers = find_server_instances(self.config)
+        # 服务器名串惰性求值：迭代 LazyServerMap 会触发目录扫描，
+        # 构造期不提前付出
+        self._servers_joined_cache: Optional[str] = None
         self.current_server = None
-        
+
+        # 当前连接的工具缓存，连接/切换服务器时刷新
+        self._tools_cache: Optional[List] = None
+        self._tools_payload_cache: Optional[List[Dict[str, Any]]] = None
+
+        # 按服务器名缓存工具及派生定义，切换回已知服务器时免去往返
+        self._tools_by_server: Dict[str, tuple] = {}
+
+        # 按服务器名缓存 Gemini 简化后的工具定义，避免每次查询递归遍历 schema
+        self._gemini_tools_cache: Dict[Optional[str], List[Dict[str, Any]]] = {}
+
+        # 系统提示惰性构建（依赖服务器名串），服务器变化时失效
+        self._system_prompt_cache: Optional[str] = None
+
         # 初始化 LLM 提供者
         self.llm_provider = None
+
+        # 按 (模型名, base_url) 缓存已初始化的提供者，避免每次查询重建客户端
+        self._provider_cache: Dict[tuple, Any] = {}
+        self._provider_lock = asyncio.Lock()
     
-    def _setup_api_keys(self) -> None:
-        """设置 API 密钥"""
-        logger.info("正在设置 API 密钥")
-        
-        # 优先使用环境变量中的 API 密钥
-        if 'OPENAI_API_KEY' in os.environ and not self.config['api'].get('openai_api_key'):
-            logger.info("从环境变量加载 OpenAI API 密钥")
-            self.config['api']['openai_api_key'] = os.environ['OPENAI_API_KEY']
-        
-        if 'ANTHROPIC_API_KEY' in os.environ and not self.config['api'].get('anthropic_api_key'):
-            self.config['api']['anthropic_api_key'] = os.environ['ANTHROPIC_API_KEY']
-            
-        if 'GOOGLE_API_KEY' in os.environ and not self.config['api'].get('google_api_key'):
-            self.config['api']['google_api_key'] = os.environ['GOOGLE_API_KEY']
-    
+    @property
+    def _servers_joined(self) -> str:
+        """可用服务器名串（首次访问时才迭代服务器映射并触发扫描）"""
+        if self._servers_joined_cache is None:
+            self._servers_joined_cache = ", ".join(self.servers)
+        return self._servers_joined_cache
+
+    @property
+    def _system_prompt_text(self) -> str:
+        """包含服务器信息的系统提示（惰性构建并缓存）"""
+        if self._system_prompt_cache is None:
+            server_info = "\n\n可用服务器: " + self._servers_joined
+            server_info += f"\n当前服务器: {self.current_server}"
+            self._system_prompt_cache = self.system_message + server_info
+        return self._system_prompt_cache
+
+    def _rebuild_system_prompt(self) -> None:
+        """作废系统提示缓存（当前服务器变化时调用）
+
+        下次访问 _system_prompt_text 时重建，避免每次查询
+        重新拼接字符串。
+        """
+        self._system_prompt_cache = None
+
     def _create_exit_stack(self) -> AsyncExitStack:
         """创建异步退出栈"""
         return AsyncExitStack()
@@ -70,21 +131,34 @@ class MCPClient:
     async def _get_llm_provider_for_model(self, model_name: Optional[str] = None) -> Any:
         """获取指定模型的 LLM 提供者"""
         if model_name is None:
-            model_name = self.config['models']['selected']
-        
+            model_name = self.default_model
+
         # 直接使用 API 密钥和基础 URL
         api_key = self.config['api']['openai_api_key']
-        base_url = self.config['api']['base_url']
-        
-        # 让 LLMFactory 基于模型名和 base_url 智能选择提供者
-        logger.info(f"初始化 LLM 提供者: {model_name}, API 端点: {base_url}")
-        try:
-            provider = LLMFactory.get_provider_for_model(model_name, api_key, base_url)
-            await provider.initialize()
+        base_url = self.base_url
+
+        # 缓存命中时直接复用已初始化的提供者
+        key = (model_name, base_url)
+        provider = self._provider_cache.get(key)
+        if provider is not None:
             return provider
-        except Exception as e:
-            logger.error(f"初始化 LLM 提供者失败: {e}")
-            raise
+
+        async with self._provider_lock:
+            # 双重检查，避免并发查询重复初始化
+            provider = self._provider_cache.get(key)
+            if provider is not None:
+                return provider
+
+            # 让 LLMFactory 基于模型名和 base_url 智能选择提供者
+            logger.info(f"初始化 LLM 提供者: {model_name}, API 端点: {base_url}")
+            try:
+                provider = LLMFactory.get_provider_for_model(model_name, api_key, base_url)
+                await provider.initialize()
+                self._provider_cache[key] = provider
+                return provider
+            except Exception as e:
+                logger.error(f"初始化 LLM 提供者失败: {e}")
+                raise
     
     async def connect_to_server(self, server_name: Optional[str] = None) -> List:
         """连接到指定的 MCP 服务器
@@ -97,14 +171,13 @@ class MCPClient:
         """
         # 如果没有指定服务器，使用默认服务器
         if server_name is None:
-            server_name = self.config['servers'].get('default', next(iter(self.servers.keys()), None))
+            server_name = self.servers.get_default()
             if server_name is None:
                 raise ValueError("未指定默认服务器且未找到可用服务器")
             
         # 检查服务器是否存在
         if server_name not in self.servers:
-            available = ", ".join(self.servers.keys())
-            raise ValueError(f"服务器 '{server_name}' 不存在。可用的服务器：{available}")
+            raise ValueError(f"服务器 '{server_name}' 不存在。可用的服务器：{self._servers_joined}")
             
         server_config = self.servers[server_name]
         self.current_server = server_name
@@ -115,24 +188,36 @@ class MCPClient:
         self.connection = create_server_connection(server_config, self.exit_stack)
         await self.connection.connect()
 
-        # 列出可用的工具
-        tools = await self.connection.list_tools()
+        # 列出可用的工具，并缓存派生的工具定义（按服务器名复用）
+        cached = self._tools_by_server.get(server_name)
+        if cached is not None:
+            tools, payload = cached
+        else:
+            tools = await self.connection.list_tools()
+            payload = self._build_tools_payload(tools)
+            self._tools_by_server[server_name] = (tools, payload)
+            self._gemini_tools_cache.pop(server_name, None)
+        self._tools_cache = tools
+        self._tools_payload_cache = payload
+        self._rebuild_system_prompt()
         logger.info(f"已连接到服务器 '{server_name}'，可用工具：{[tool.name for tool in tools]}")
-        
+
         return tools
     
-    async def suggest_server_for_query(self, query: str) -> Optional[str]:
+    def suggest_server_for_query(self, query: str) -> Optional[str]:
         """
         根据查询内容建议服务器
-        
+
+        纯同步实现：逻辑是常量时间的字典访问，无需协程开销。
+
         Args:
             query: 用户查询
-        
+
         Returns:
             建议的服务器名称
         """
-        # 保持简单，只返回第一个可用服务器或当前服务器
-        return self.current_server or next(iter(self.servers.keys()), None)
+        # 保持简单，只返回当前服务器或默认服务器
+        return self.current_server or self.servers.get_default()
     
     def _simplify_schema_for_gemini(self, schema: Dict[str, Any]) -> Dict[str, Any]:
         """简化 JSON Schema 以适配 Gemini API
@@ -145,29 +230,73 @@ class MCPClient:
         """
         if not isinstance(schema, dict):
             return schema
-            
-        result = {}
-        
-        # 复制基本字段
-        for key, value in schema.items():
-            # 跳过 Gemini 不支持的字段
-            if key in ["$defs", "$ref", "default"]:
-                continue
-                
-            # 递归处理嵌套字典
-            if isinstance(value, dict):
-                result[key] = self._simplify_schema_for_gemini(value)
-            # 递归处理列表
-            elif isinstance(value, list):
-                result[key] = [
-                    self._simplify_schema_for_gemini(item) if isinstance(item, dict) else item
-                    for item in value
-                ]
+
+        # 迭代式 DFS：显式工作栈代替递归，避免逐层创建 Python 栈帧
+        result: Dict[str, Any] = {}
+        stack = [(schema, result)]
+
+        while stack:
+            src, dst = stack.pop()
+
+            if type(src) is dict:
+                for key, value in src.items():
+                    # 跳过 Gemini 不支持的字段
+                    if key in _EXCLUDED_SCHEMA_KEYS:
+                        continue
+
+                    if type(value) is dict:
+                        child: Any = {}
+                        dst[key] = child
+                        stack.append((value, child))
+                    elif type(value) is list:
+                        child = []
+                        dst[key] = child
+                        stack.append((value, child))
+                    else:
+                        dst[key] = value
             else:
-                result[key] = value
-                
+                # 列表：只简化其中的字典项，其余原样保留
+                for item in src:
+                    if type(item) is dict:
+                        child = {}
+                        dst.append(child)
+                        stack.append((item, child))
+                    else:
+                        dst.append(item)
+
         return result
     
+    def _build_tools_payload(self, tools: List) -> List[Dict[str, Any]]:
+        """将工具列表转换为 LLM API 的工具定义
+
+        Args:
+            tools: Tool 对象列表
+
+        Returns:
+            工具定义字典列表
+        """
+        def _schema(s: Any) -> Dict[str, Any]:
+            # 确保 schema 是符合 OpenAI 要求的有效 JSON Schema
+            if not s:
+                # 无参数工具共享同一个空 schema，省去逐工具的字典分配
+                return _EMPTY_PARAMS_SCHEMA
+            if isinstance(s, dict) and "type" in s:
+                return s
+            return {
+                "type": "object",
+                "properties": s if isinstance(s, dict) else {},
+                "required": []
+            }
+
+        return [{
+            "type": "function",
+            "function": {
+                "name": tool.name,
+                "description": tool.description,
+                "parameters": _schema(tool.inputSchema)
+            }
+        } for tool in tools]
+
     def _prepare_tools_for_model(self, tools: List[Dict[str, Any]], model: str) -> List[Dict[str, Any]]:
         """根据模型类型准备工具定义
         
@@ -180,10 +309,15 @@ class MCPClient:
         """
         # 检查是否是 Gemini 模型
         is_gemini = "gemini" in model.lower()
-        
+
         if not is_gemini:
             return tools
-            
+
+        # 工具 schema 对同一服务器是稳定的，简化结果可直接复用
+        cached = self._gemini_tools_cache.get(self.current_server)
+        if cached is not None:
+            return cached
+
         # 为 Gemini 简化工具定义
         simplified_tools = []
         for tool in tools:
@@ -200,184 +334,222 @@ class MCPClient:
                 simplified_tool["function"] = function_def
                 
             simplified_tools.append(simplified_tool)
-            
+
+        self._gemini_tools_cache[self.current_server] = simplified_tools
         return simplified_tools
     
+    async def _execute_tool_call(self, tool_call: Dict[str, Any]) -> str:
+        """执行单个工具调用并返回字符串形式的结果
+
+        Args:
+            tool_call: LLM 返回的工具调用字典
+
+        Returns:
+            工具结果内容（字符串）
+        """
+        function_name = tool_call["function"]["name"]
+        function_args = _json_loads(tool_call["function"]["arguments"])
+
+        logger.debug(f"正在调用工具: {function_name}, 参数: {function_args}")
+
+        # 调用工具并获取结果，由连接类型按已知形状提取内容
+        try:
+            result = await self.connection.call_tool(function_name, function_args)
+            logger.debug(f"工具调用成功: {function_name}")
+            tool_result_content = self.connection._extract_content(result)
+        except Exception as e:
+            logger.error(f"工具调用失败: {function_name}, 错误: {e}")
+            tool_result_content = str({"error": str(e)})
+
+        # 记录调试信息（lazy：只在 DEBUG 级别启用时才执行格式化）
+        logger.opt(lazy=True).debug(
+            "工具返回结果：{}",
+            lambda: (tool_result_content[:100] + "..."
+                     if len(tool_result_content) > 100 else tool_result_content)
+        )
+
+        return tool_result_content
+
+    async def process_query_stream(self, query: str, model: Optional[str] = None):
+        """处理用户查询，流式产出回复文本块
+
+        与 process_query 流程类似，但只做一次带工具的 LLM 调用，
+        并通过 generate_completion_stream 逐块产出最终回复，
+        降低首 token 延迟。
+        """
+        if model is None:
+            model = self.default_model
+
+        logger.info(f"正在处理流式查询: '{query}'")
+
+        # 如果未连接到服务器，连接到默认服务器
+        if self.connection is None:
+            await self.connect_to_server()
+
+        # 获取 LLM 提供者
+        llm_provider = await self._get_llm_provider_for_model(model)
+
+        # 直接使用当前服务器的缓存工具定义，单次带工具调用
+        available_tools = self._prepare_tools_for_model(self._tools_payload_cache or [], model)
+
+        query_messages = [
+            llm_provider.format_system_message(self.system_message),
+            llm_provider.format_user_message(query)
+        ]
+
+        completion = await llm_provider.generate_completion(
+            messages=query_messages,
+            model=model,
+            tools=available_tools
+        )
+
+        content = llm_provider.extract_text(completion)
+        if content:
+            yield content
+
+        # 处理工具调用，然后流式获取最终回复
+        tool_calls = llm_provider.extract_tool_calls(completion)
+        if tool_calls:
+            logger.opt(lazy=True).info(
+                "LLM 请求调用工具: {}",
+                lambda: [tc['function']['name'] for tc in tool_calls]
+            )
+            query_messages.append(llm_provider.format_assistant_message(content, tool_calls))
+
+            # 并发执行相互独立的工具调用
+            results = await asyncio.gather(
+                *(self._execute_tool_call(tc) for tc in tool_calls)
+            )
+            for tool_call, tool_result_content in zip(tool_calls, results):
+                query_messages.append(llm_provider.format_tool_message(
+                    tool_call["id"],
+                    tool_call["function"]["name"],
+                    tool_result_content
+                ))
+
+            if content:
+                yield "\n"
+
+            logger.debug("正在流式获取 LLM 最终响应...")
+            async for chunk in llm_provider.generate_completion_stream(
+                messages=query_messages,
+                model=model
+            ):
+                yield chunk
+
+        logger.debug("流式查询处理完成")
+
     async def process_query(self, query: str, model: Optional[str] = None) -> str:
         """处理用户查询"""
         # 如果未指定模型，使用配置的默认模型
         if model is None:
-            model = self.config['models']['selected']
+            model = self.default_model
         
         try:
-            logger.info(f"正在处理查询: '{query}'")
-            
+            # 合并为一条日志，减少热路径上的格式化与分发次数
+            logger.info(f"正在处理查询: '{query}'（模型: {model}）")
+
             # 如果未连接到服务器，连接到默认服务器
             if self.connection is None:
                 await self.connect_to_server()
-            
+
             # 获取 LLM 提供者
             llm_provider = await self._get_llm_provider_for_model(model)
-            logger.info(f"已初始化 LLM 提供者: {model}")
-            
-            # 第一步：让 LLM 决定使用哪个服务器
-            # 构建包含服务器信息的消息
-            server_info = "\n\n可用服务器: " + ", ".join(self.servers.keys())
-            server_info += f"\n当前服务器: {self.current_server}"
-            
-            messages = [
-                llm_provider.format_system_message(self.config['system']['message'] + server_info),
-                llm_provider.format_user_message(query)
-            ]
-            
-            # 第一次 LLM API 调用，让模型决定使用哪个服务器
-            logger.info("进行第一次 LLM API 调用，决定使用哪个服务器")
-            completion = await llm_provider.generate_completion(
-                messages=messages,
-                model=model
-            )
-            
-            # 从 LLM 响应中提取服务器选择
-            content = llm_provider.extract_text(completion)
-            
-            # 解析内容中的服务器选择指令 (!use_server:服务器名称)
-            server_name = None
-            import re
-            server_match = re.search(r'!use_server:([^\s]+)', content)
-            if server_match:
-                server_name = server_match.group(1)
-                # 从内容中移除指令
-                content = re.sub(r'!use_server:[^\s]+\s*', '', content)
-                logger.info(f"LLM 选择使用服务器: {server_name}")
-            else:
-                # 如果没有明确指令，使用建议的服务器
-                server_name = await self.suggest_server_for_query(query)
-                logger.info(f"没有明确服务器选择，使用默认服务器: {server_name}")
-
-            # 确保是有效的服务器
-            if server_name not in self.servers:
-                server_name = self.current_server or next(iter(self.servers.keys()))
-                logger.info(f"指定的服务器无效，使用: {server_name}")
-            
-            # 如果需要切换服务器
-            if self.current_server != server_name:
-                logger.info(f"切换到服务器: {server_name}")
-                await self.connect_to_server(server_name)
-            
-            # 第二步：使用选定的服务器和工具执行查询
-            # 获取当前服务器的工具
-            tools = await self.connection.list_tools()
-            # 创建工具名到输入模式的映射，用于后续参数验证
-            tool_schema_map = {tool.name: tool.inputSchema for tool in tools}
-            
-            # 准备工具定义
-            available_tools = []
-            for tool in tools:
-                # 确保schema是有效的JSON Schema
-                schema = tool.inputSchema
-                if not isinstance(schema, dict):
-                    schema = {}
-                
-                # 确保schema符合OpenAI要求
-                if "type" not in schema:
-                    schema = {
-                        "type": "object",
-                        "properties": schema,
-                        "required": []
-                    }
-                
-                available_tools.append({
-                    "type": "function",
-                    "function": {
-                        "name": tool.name,
-                        "description": tool.description,
-                        "parameters": schema
-                    }
-                })
             
+            # 单次调用：系统提示附带服务器信息，同时直接带上当前服务器的工具
+            # 常见情况（不切换服务器）只需一次往返
+            # 使用连接时缓存的工具定义，避免每次查询重新请求
+            if self._tools_payload_cache is None:
+                tools = await self.connection.list_tools()
+                self._tools_cache = tools
+                self._tools_payload_cache = self._build_tools_payload(tools)
+
             # 为特定模型处理工具定义
-            available_tools = self._prepare_tools_for_model(available_tools, model)
-            
-            # 创建新的消息列表，不包括服务器选择指令
+            available_tools = self._prepare_tools_for_model(self._tools_payload_cache, model)
+
             query_messages = [
-                llm_provider.format_system_message(self.config['system']['message']),
+                llm_provider.format_system_message(self._system_prompt_text),
                 llm_provider.format_user_message(query)
             ]
-            
-            # 第二次 LLM API 调用，实际执行查询
-            logger.info(f"进行第二次 LLM API 调用，使用服务器 '{server_name}' 的工具")
+
+            logger.debug(f"进行 LLM API 调用，使用服务器 '{self.current_server}' 的工具")
             completion = await llm_provider.generate_completion(
                 messages=query_messages,
                 model=model,
                 tools=available_tools
             )
-            
-            # 处理响应和工具调用
-            final_text = []
+
             content = llm_provider.extract_text(completion)
-            
+
+            # 如果模型要求切换服务器，连接新服务器后用其工具重发一次
+            server_match = _USE_SERVER_RE.search(content) if content else None
+            if server_match:
+                server_name = server_match.group(1)
+                content = _USE_SERVER_RE.sub('', content)
+
+                if server_name in self.servers and server_name != self.current_server:
+                    logger.info(f"LLM 选择使用服务器: {server_name}，切换后重试")
+                    await self.connect_to_server(server_name)
+                    available_tools = self._prepare_tools_for_model(self._tools_payload_cache, model)
+                    completion = await llm_provider.generate_completion(
+                        messages=query_messages,
+                        model=model,
+                        tools=available_tools
+                    )
+                    content = llm_provider.extract_text(completion)
+                    if content:
+                        content = _USE_SERVER_RE.sub('', content)
+
+            # 处理响应和工具调用
+            buf = io.StringIO()
+
             if content:
-                logger.info("获取到初始回复内容")
-                final_text.append(content)
+                logger.debug("获取到初始回复内容")
+                buf.write(content)
+                buf.write("\n")
             
             # 处理工具调用
             tool_calls = llm_provider.extract_tool_calls(completion)
             if tool_calls:
-                logger.info(f"LLM 请求调用工具: {[tc['function']['name'] for tc in tool_calls]}")
-                
+                logger.opt(lazy=True).info(
+                    "LLM 请求调用工具: {}",
+                    lambda: [tc['function']['name'] for tc in tool_calls]
+                )
+
                 # 添加助手消息
                 query_messages.append(llm_provider.format_assistant_message(content, tool_calls))
                 
-                # 处理每个工具调用
-                for tool_call in tool_calls:
-                    function_name = tool_call["function"]["name"]
-                    function_args = json.loads(tool_call["function"]["arguments"])
-                    
-                    logger.info(f"正在调用工具: {function_name}, 参数: {function_args}")
-                    
-                    # 调用工具并获取结果
-                    try:
-                        result = await self.connection.call_tool(function_name, function_args)
-                        logger.info(f"工具调用成功: {function_name}")
-                    except Exception as e:
-                        logger.error(f"工具调用失败: {function_name}, 错误: {e}")
-                        result = {"error": str(e)}
-                    
-                    # 将结果转换为可用的字符串
-                    if hasattr(result, 'content'):
-                        tool_result_content = str(result.content)
-                    elif isinstance(result, dict) and "content" in result:
-                        tool_result_content = str(result["content"])
-                    else:
-                        tool_result_content = str(result)
-                    
-                    # 记录调试信息
-                    if self.config['system'].get('debug', False):
-                        logger.debug(f"工具返回结果：{tool_result_content[:100]}...")
-                    
-                    # 将工具结果添加到消息
+                # 并发执行相互独立的工具调用，总延迟取决于最慢的一个
+                results = await asyncio.gather(
+                    *(self._execute_tool_call(tc) for tc in tool_calls)
+                )
+
+                # 将工具结果添加到消息
+                for tool_call, tool_result_content in zip(tool_calls, results):
                     query_messages.append(llm_provider.format_tool_message(
-                        tool_call["id"], 
-                        function_name, 
+                        tool_call["id"],
+                        tool_call["function"]["name"],
                         tool_result_content
                     ))
                 
-                logger.info("正在获取 LLM 最终响应...")
+                logger.debug("正在获取 LLM 最终响应...")
                 # 获取 LLM 的最终响应
                 try:
                     completion = await llm_provider.generate_completion(
                         messages=query_messages,
                         model=model
                     )
-                    logger.info("最终 LLM API 调用成功")
-                    final_text.append(llm_provider.extract_text(completion))
+                    logger.debug("最终 LLM API 调用成功")
+                    final_content = llm_provider.extract_text(completion)
+                    if final_content:
+                        buf.write(final_content)
                 except Exception as e:
                     logger.error(f"最终 LLM API 调用失败: {e}")
-                    return "\n".join(filter(None, final_text)) + f"\n\n处理查询时出错: {str(e)}"
-            
+                    return buf.getvalue().rstrip("\n") + f"\n\n处理查询时出错: {str(e)}"
+
             # 返回结果
-            result = "\n".join(filter(None, final_text))
-            logger.info("查询处理完成，返回结果")
+            result = buf.getvalue().rstrip("\n")
+            logger.debug("查询处理完成，返回结果")
             return result
         except Exception as e:
             logger.error(f"处理查询时出现未捕获的错误: {e}", exc_info=True)
@@ -385,21 +557,27 @@ class MCPClient:
     
     async def cleanup(self):
         """清理资源"""
+        # 这些属性都在 __init__ 中必然设置，无需 hasattr 探测
+        if self.connection:
+            logger.info("正在关闭服务器连接...")
+            self.connection = None
+
+        # 退出栈必须在本任务内关闭：MCP 传输的 anyio 取消作用域
+        # 只能由进入它的任务退出，不能交给 gather 的子任务
+        logger.info("正在清理资源...")
         try:
-            # 关闭连接
-            if hasattr(self, 'connection') and self.connection:
-                logger.info("正在关闭服务器连接...")
-                self.connection = None
-            
-            # 关闭 HTTP 客户端
-            if hasattr(self, 'http_client') and self.http_client:
-                logger.info("正在关闭 HTTP 客户端...")
-                await self.http_client.aclose()
-            
-            # 关闭退出栈
-            if hasattr(self, 'exit_stack') and self.exit_stack:
-                logger.info("正在清理资源...")
-                await self.exit_stack.aclose()
-                
+            await self.exit_stack.aclose()
         except Exception as e:
-            logger.error(f"清理资源时出错: {e}")
\ No newline at end of file
+            logger.error(f"关闭服务器连接时出错: {e}")
+
+        # 缓存的 LLM 提供者与 HTTP 客户端相互独立，并发关闭
+        closers = [provider.close() for provider in self._provider_cache.values()]
+        self._provider_cache.clear()
+        # provider 的 HTTP 客户端是进程级共享的，统一在此关闭
+        closers.append(LLMFactory.shutdown_clients())
+        closers.append(self.http_client.aclose())
+
+        results = await asyncio.gather(*closers, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.error(f"清理资源时出错: {result}")
\ No newline at end of file
@@ -1,8 +1,103 @@
 import os
+import copy
+import functools
+import json
 import yaml
 from typing import Dict, Any, Optional
 from pathlib import Path
 
+# 优先使用 libyaml C 扩展，加速 YAML 解析/序列化
+try:
+    from yaml import CSafeLoader as _Loader, CSafeDumper as _Dumper
+except ImportError:
+    from yaml import SafeLoader as _Loader, SafeDumper as _Dumper
+
+def _read_json_cache(path: str) -> Optional[Dict[str, Any]]:
+    """读取 JSON 缓存（如果比 YAML 源文件新）
+
+    Args:
+        path: YAML 配置文件路径
+
+    Returns:
+        缓存的配置字典，缓存不存在或已过期时返回 None
+    """
+    cache_path = path + ".cache.json"
+    try:
+        if os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            with open(cache_path, 'rb') as f:
+                return json.loads(f.read())
+    except (OSError, ValueError):
+        pass
+    return None
+
+def _write_json_cache(path: str, config: Dict[str, Any]) -> None:
+    """写入 JSON 缓存（原子替换，失败时静默忽略）
+
+    Args:
+        path: YAML 配置文件路径
+        config: 已解析的配置字典
+    """
+    cache_path = path + ".cache.json"
+    tmp_path = cache_path + ".tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    except (OSError, TypeError, ValueError):
+        # YAML 原生类型（如 date）可能无法 JSON 序列化，
+        # 缓存退化为不生效，不影响配置加载本身
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+@functools.cache
+def _default_config_path() -> str:
+    """计算默认配置文件的绝对路径（进程生命周期内不变）"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "default_config.yaml")
+
+# (环境变量名, 配置键) 映射，API 密钥统一经此加载
+_ENV_API_KEYS = (
+    ('OPENAI_API_KEY', 'openai_api_key'),
+    ('ANTHROPIC_API_KEY', 'anthropic_api_key'),
+    ('GOOGLE_API_KEY', 'google_api_key'),
+)
+
+# 进程级配置缓存，键为 (绝对路径, mtime_ns)，文件变化时自动失效
+_config_cache: Dict[tuple, Dict[str, Any]] = {}
+
+def _load_config_file(path: str) -> Dict[str, Any]:
+    """解析配置文件，按 (绝对路径, mtime) 缓存
+
+    同一路径的后续加载只是一次字典查找；文件被修改后
+    （mtime 变化）会自动重新解析。测试中可用
+    `_config_cache.clear()` 强制重新解析。
+
+    Args:
+        path: 配置文件的绝对路径
+
+    Returns:
+        解析后的配置字典（共享实例，调用方不应直接修改）
+    """
+    key = (path, os.stat(path).st_mtime_ns)
+    cached = _config_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if path.endswith('.json'):
+        # JSON 配置直接用 C 解析器加载，无需 sidecar 缓存
+        with open(path, 'rb') as f:
+            config = json.loads(f.read())
+    else:
+        config = _read_json_cache(path)
+        if config is None:
+            with open(path, 'r', encoding='utf-8') as f:
+                config = yaml.load(f, Loader=_Loader)
+            _write_json_cache(path, config)
+
+    _config_cache[key] = config
+    return config
+
 class ConfigManager:
     """配置管理类"""
     
@@ -12,7 +107,7 @@ class ConfigManager:
     
     def get_default_config_path(self) -> str:
         """获取默认配置文件路径"""
-        return os.path.join(os.path.dirname(__file__), "default_config.yaml")
+        return _default_config_path()
     
     def load(self, config_path: Optional[str] = None) -> Dict[str, Any]:
         """加载配置文件
@@ -24,32 +119,30 @@ class ConfigManager:
             配置字典
         """
         # 使用指定的配置路径或默认路径
-        path = config_path or self.config_path or self.get_default_config_path()
-        
+        path = os.path.abspath(config_path or self.config_path or self.get_default_config_path())
+
         # 如果配置文件不存在，创建默认配置
         if not os.path.exists(path):
             self.create_default_config(path)
-            
-        # 加载配置
-        with open(path, 'r', encoding='utf-8') as f:
-            self.config = yaml.safe_load(f)
-            
+
+        # 从进程级缓存加载（深拷贝，调用方会修改 selected model 等字段）
+        self.config = copy.deepcopy(_load_config_file(path))
+
         # 从环境变量加载敏感信息
         self._load_from_env()
         
         return self.config
     
     def _load_from_env(self) -> None:
-        """从环境变量加载配置值"""
-        # API 密钥
-        if 'OPENAI_API_KEY' in os.environ and 'api' in self.config:
-            self.config['api']['openai_api_key'] = os.environ['OPENAI_API_KEY']
-            
-        if 'ANTHROPIC_API_KEY' in os.environ and 'api' in self.config:
-            self.config['api']['anthropic_api_key'] = os.environ['ANTHROPIC_API_KEY']
-            
-        if 'GOOGLE_API_KEY' in os.environ and 'api' in self.config:
-            self.config['api']['google_api_key'] = os.environ['GOOGLE_API_KEY']
+        """从环境变量加载配置值（仅填充配置中未设置的 API 密钥）"""
+        api = self.config.get('api')
+        if api is None:
+            return
+
+        for env_name, key in _ENV_API_KEYS:
+            value = os.environ.get(env_name)
+            if value and not api.get(key):
+                api[key] = value
     
     def create_default_config(self, config_path: str) -> None:
         """创建默认配置文件
@@ -97,7 +190,10 @@ class ConfigManager:
         
         # 创建目录（如果不存在）
         os.makedirs(os.path.dirname(os.path.abspath(config_path)), exist_ok=True)
-        
-        # 写入配置文件
+
+        # 写入配置文件（按扩展名选择格式，JSON 解析更快）
         with open(config_path, 'w', encoding='utf-8') as f:
-            yaml.dump(default_config, f, default_flow_style=False, sort_keys=False)
\ No newline at end of file
+            if config_path.endswith('.json'):
+                json.dump(default_config, f, ensure_ascii=False, indent=2)
+            else:
+                yaml.dump(default_config, f, Dumper=_Dumper, default_flow_style=False, sort_keys=False)
\ No newline at end of file
@@ -1,28 +1,42 @@
 from typing import Dict, Any
 from contextlib import AsyncExitStack
 
+import importlib
+
 from .base import ServerConnection
-from .stdio import StdioConnection
-from .sse import SSEConnection
-from .command import CommandConnection
+
+# 类型 -> (模块, 类名) 调度表，连接器模块在首次使用时才导入
+_CONNECTORS = {
+    "stdio": (".stdio", "StdioConnection"),
+    "sse": (".sse", "SSEConnection"),
+    "command": (".command", "CommandConnection"),
+}
+
+# 已加载的连接器类缓存
+_loaded_connectors: Dict[str, type] = {}
 
 def create_server_connection(server_config: Dict[str, Any], exit_stack: AsyncExitStack) -> ServerConnection:
     """创建服务器连接对象
-    
+
+    通过字典表按类型分派；连接器类在首次使用对应类型时才导入，
+    减小纯命令路径（!help、!servers 等）的启动导入开销。
+
     Args:
         server_config: 服务器配置
         exit_stack: 异步退出栈
-        
+
     Returns:
         ServerConnection 实例
     """
     server_type = server_config.get("type", "stdio")
-    
-    if server_type == "stdio":
-        return StdioConnection(server_config, exit_stack)
-    elif server_type == "sse":
-        return SSEConnection(server_config, exit_stack)
-    elif server_type == "command":
-        return CommandConnection(server_config, exit_stack)
-    else:
-        raise ValueError(f"不支持的服务器类型: {server_type}")
\ No newline at end of file
+
+    cls = _loaded_connectors.get(server_type)
+    if cls is None:
+        spec = _CONNECTORS.get(server_type)
+        if spec is None:
+            raise ValueError(f"不支持的服务器类型: {server_type}")
+        module = importlib.import_module(spec[0], __package__)
+        cls = getattr(module, spec[1])
+        _loaded_connectors[server_type] = cls
+
+    return cls(server_config, exit_stack)
\ No newline at end of file
@@ -0,0 +1,27 @@
+# src/connectors/_fused.py
+"""传输与会话融合的异步上下文管理器
+
+各连接器原本分两次 enter_async_context 进入传输层和 ClientSession，
+每个服务器在退出栈上占两帧。这里把两层合成一个复合上下文管理器，
+单次进入即得到已初始化的会话，退出时按正确顺序收敛两层。
+"""
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from mcp import ClientSession
+
+@asynccontextmanager
+async def fused_session(transport_cm: Any) -> AsyncIterator[ClientSession]:
+    """进入传输上下文、包装并初始化 ClientSession
+
+    Args:
+        transport_cm: 产出 (读流, 写流) 的传输上下文管理器
+            （如 stdio_client(...) 或 sse_client(...)）
+
+    Yields:
+        已完成 initialize 的 ClientSession
+    """
+    async with transport_cm as (read_stream, write_stream):
+        async with ClientSession(read_stream, write_stream) as session:
+            await session.initialize()
+            yield session
@@ -7,15 +7,21 @@ from ..llm.base import LLMProvider
 
 class Tool:
     """表示 MCP 工具的类"""
-    
-    def __init__(self, name: str, description: str = "", inputSchema: Dict = {}):
+
+    # 每次 list_tools 都会批量实例化，__slots__ 去掉逐实例 __dict__
+    __slots__ = ("name", "description", "inputSchema")
+
+    def __init__(self, name: str, description: str = "", inputSchema: Optional[Dict] = None):
         self.name = name
         self.description = description
-        self.inputSchema = inputSchema
+        # None 哨兵代替共享的可变默认值，每个实例持有自己的 schema
+        self.inputSchema = inputSchema if inputSchema is not None else {}
 
 class ServerConnection(ABC):
     """MCP 服务器连接的抽象基类"""
-    
+
+    __slots__ = ("config", "exit_stack", "session")
+
     def __init__(self, config: Dict[str, Any], exit_stack: AsyncExitStack):
         self.config = config
         self.exit_stack = exit_stack
@@ -34,4 +40,15 @@ class ServerConnection(ABC):
     @abstractmethod
     async def call_tool(self, tool_name: str, args: Dict[str, Any]) -> Any:
         """调用工具"""
-        pass
\ No newline at end of file
+        pass
+
+    def _extract_content(self, result: Any) -> str:
+        """将工具调用结果转换为字符串内容
+
+        通用回退实现，子类可按已知的结果形状覆盖以避免逐次属性探测。
+        """
+        if hasattr(result, 'content'):
+            return str(result.content)
+        if isinstance(result, dict) and "content" in result:
+            return str(result["content"])
+        return str(result)
\ No newline at end of file
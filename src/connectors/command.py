@@ -11,14 +11,15 @@ from ..log import logger
 
 class CommandConnection(ServerConnection):
     """通过命令启动 MCP 服务器并连接"""
-    
+
+    __slots__ = ("command", "args", "cwd", "env")
+
     def __init__(self, config: Dict[str, Any], exit_stack: AsyncExitStack):
         super().__init__(config, exit_stack)
         self.command = config.get("command")
         self.args = config.get("args", [])
         self.cwd = config.get("cwd", ".")
         self.env = config.get("env", {})
-        self.session = None
     
     async def connect(self) -> ClientSession:
         """连接到服务器"""
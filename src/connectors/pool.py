@@ -0,0 +1,52 @@
+# src/connectors/pool.py
+"""MCP 会话池
+
+单个 ClientSession 上并发的 call_tool 会在同一条管道/SSE 流上
+串行排队。会话池维护若干会话，并发的工具调用各自取一个空闲会话，
+墙钟时间随扇出并行化。
+
+池中会话全部在连接建立时由拥有连接的任务预先创建并注入：
+MCP 传输基于 anyio 任务组，取消作用域必须由进入它的任务退出，
+在并发工具调用的子任务里惰性扩容会导致清理时跨任务退出而报错。
+默认池大小为 1（沿用现有的单会话行为），通过服务器配置的
+pool_size 字段开启更大的池。
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+class SessionPool:
+    """异步会话池（asyncio.Queue 管理空闲会话）"""
+
+    __slots__ = ("_idle", "_size")
+
+    def __init__(self):
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._size = 0
+
+    @property
+    def size(self) -> int:
+        """池中会话总数
+
+        单会话时调用方应绕开池直接用主会话：ClientSession 自身
+        支持多请求并发在飞（按请求 id 匹配响应），独占取用反而
+        会把并发工具调用串行化。
+        """
+        return self._size
+
+    def seed(self, session: Any) -> None:
+        """放入会话（连接建立时由拥有连接的任务注入）"""
+        self._idle.put_nowait(session)
+        self._size += 1
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Any]:
+        """取出一个会话，用完自动归还
+
+        没有空闲会话时等待其他调用归还。
+        """
+        session = await self._idle.get()
+        try:
+            yield session
+        finally:
+            self._idle.put_nowait(session)
@@ -1,37 +1,100 @@
 #src/connectors/sse.py
 from .base import ServerConnection, Tool
-from typing import Dict, Any, List
+from .tool_cache import ToolCache
+from ._fused import fused_session
+from .pool import SessionPool
+from typing import Dict, Any, List, Optional
+import inspect
 import os
 from contextlib import AsyncExitStack
-from mcp import StdioServerParameters, ClientSession
+from mcp import Tool as MCPTool
 from mcp.client.sse import sse_client
 from ..log import logger
 
+# 锁定的 mcp 1.6 的 sse_client 没有 on_session_created 回调，
+# 按签名探测，不支持时跳过会话延续，不传未知参数
+_SSE_SUPPORTS_SESSION_CALLBACK = (
+    "on_session_created" in inspect.signature(sse_client).parameters
+)
+
+# 预构建的高德默认工具，回退路径只做一次浅拷贝
+_DEFAULT_SSE_TOOLS = [
+    MCPTool(
+        name="geocode",
+        description="地理编码服务，将地址转换为经纬度坐标",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "address": {
+                    "type": "string",
+                    "description": "需要转换的地址"
+                },
+                "city": {
+                    "type": "string",
+                    "description": "查询城市"
+                }
+            },
+            "required": ["address"]
+        }
+    ),
+    MCPTool(
+        name="weather",
+        description="天气查询服务，获取指定城市天气信息",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "city": {
+                    "type": "string",
+                    "description": "城市名称或城市adcode"
+                }
+            },
+            "required": ["city"]
+        }
+    ),
+    # 更多工具可以根据需要添加
+]
+
+# 按 URL 缓存的会话 ID 与工具列表，跨重连复用：
+# 支持会话延续的服务器可免去重新协商，工具列表免去一次往返
+_SESSION_IDS: Dict[str, str] = {}
+_TOOLS_BY_URL: Dict[str, Any] = {}
+
 class SSEConnection(ServerConnection):
     """通过 HTTP/SSE 连接到远程 MCP 服务器"""
-    
+
+    __slots__ = ("url", "api_key", "tools_cache", "_converted_tools", "_tool_cache", "_pool")
+
     def __init__(self, config: Dict[str, Any], exit_stack: AsyncExitStack):
         super().__init__(config, exit_stack)
         self.url = config["url"]
         self.api_key = config.get("api_key", "")
-        self.sse_session = None
-        self.write_func = None  # 添加写入函数
         self.tools_cache = None
+        # 转换后的 Tool 列表缓存，与原始 tools_cache 分开维护
+        self._converted_tools: Optional[List[Tool]] = None
+        # 工具结果缓存，TTL 策略可由配置的 tool_cache 字段覆盖
+        self._tool_cache = ToolCache(ttl_policy=config.get("tool_cache"))
+        self._pool: Optional[SessionPool] = None
     
     async def connect(self) -> Any:
         """连接到远程 MCP 服务器"""
         logger.info(f"正在连接到 SSE 服务器 '{self.url}'")
-        
-        # 修正: sse_client 返回 (session, write_function) 元组
-        sse_transport = await self.exit_stack.enter_async_context(sse_client(self.url))
-        self.sse_session, self.write_func = sse_transport
-        
-        # 使用 ClientSession 包装基础传输
-        self.session = await self.exit_stack.enter_async_context(ClientSession(self.sse_session, self.write_func))
-        
-        # 初始化会话
-        await self.session.initialize()
-        
+
+        self.session = await self._establish_session()
+
+        # 会话池：pool_size > 1 时并发工具调用可各用一个 SSE 会话。
+        # 额外会话在本任务内预先建立——退出栈由本任务关闭，
+        # anyio 取消作用域不允许在别的任务（如 gather 子任务）里进入
+        self._pool = SessionPool()
+        self._pool.seed(self.session)
+        for _ in range(self.config.get("pool_size", 1) - 1):
+            self._pool.seed(await self._spawn_session())
+
+        # 复用同一 URL 上次会话的工具列表，跳过重连后的 list_tools 往返
+        cached_tools = _TOOLS_BY_URL.get(self.url)
+        if cached_tools is not None:
+            self.tools_cache = cached_tools
+            return self.session
+
         # 尝试获取工具列表
         try:
             tools_response = await self.session.list_tools()
@@ -40,14 +103,54 @@ class SSEConnection(ServerConnection):
         except Exception as e:
             logger.warning(f"无法获取工具列表，使用预定义工具: {e}")
             self.tools_cache = self._get_default_tools()
-        
+        _TOOLS_BY_URL[self.url] = self.tools_cache
+
         return self.session
+
+    async def _establish_session(self):
+        """建立 SSE 会话，优先尝试延续上次的 Mcp-Session-Id
+
+        服务器分配新会话 ID 时经 on_session_created 回调记录；
+        带旧 ID 的重连被拒绝时清除缓存并完整重连一次。
+        SDK 不支持该回调时退化为普通连接（无会话延续）。
+        """
+        if not _SSE_SUPPORTS_SESSION_CALLBACK:
+            return await self.exit_stack.enter_async_context(
+                fused_session(sse_client(self.url))
+            )
+
+        def _remember(session_id: str) -> None:
+            _SESSION_IDS[self.url] = session_id
+
+        headers = None
+        cached_id = _SESSION_IDS.get(self.url)
+        if cached_id:
+            headers = {"Mcp-Session-Id": cached_id}
+
+        # 传输与会话融合为单帧进入，退出栈上每个服务器只占一帧
+        try:
+            return await self.exit_stack.enter_async_context(
+                fused_session(sse_client(self.url, headers=headers,
+                                         on_session_created=_remember))
+            )
+        except Exception:
+            if headers is None:
+                raise
+            # 会话延续被拒绝，丢弃旧 ID 后完整重连
+            logger.warning(f"会话延续失败，重新建立与 '{self.url}' 的会话")
+            _SESSION_IDS.pop(self.url, None)
+            return await self.exit_stack.enter_async_context(
+                fused_session(sse_client(self.url, on_session_created=_remember))
+            )
     
     async def list_tools(self) -> List[Tool]:
-        """获取可用的工具列表"""
+        """获取可用的工具列表（转换结果缓存，按次调用零分配）"""
         if not self.session:
             raise RuntimeError("未连接到服务器")
-            
+
+        if self._converted_tools is not None:
+            return self._converted_tools
+
         if self.tools_cache is None:
             try:
                 tools_response = await self.session.list_tools()
@@ -55,65 +158,52 @@ class SSEConnection(ServerConnection):
             except Exception as e:
                 logger.warning(f"获取工具列表失败: {e}")
                 self.tools_cache = self._get_default_tools()
-        
-        # 将工具转换为我们的 Tool 类型
-        return [Tool(
+
+        # 将工具转换为我们的 Tool 类型（只做一次）
+        self._converted_tools = [Tool(
             name=tool.name,
             description=tool.description,
             inputSchema=tool.inputSchema
         ) for tool in self.tools_cache]
+        return self._converted_tools
     
     def _get_default_tools(self):
-        """返回高德默认工具列表"""
-        from mcp import Tool as MCPTool
-        
-        default_tools = [
-            MCPTool(
-                name="geocode", 
-                description="地理编码服务，将地址转换为经纬度坐标",
-                inputSchema={
-                    "type": "object", 
-                    "properties": {
-                        "address": {
-                            "type": "string",
-                            "description": "需要转换的地址"
-                        },
-                        "city": {
-                            "type": "string",
-                            "description": "查询城市"
-                        }
-                    },
-                    "required": ["address"]
-                }
-            ),
-            MCPTool(
-                name="weather", 
-                description="天气查询服务，获取指定城市天气信息",
-                inputSchema={
-                    "type": "object", 
-                    "properties": {
-                        "city": {
-                            "type": "string",
-                            "description": "城市名称或城市adcode"
-                        }
-                    },
-                    "required": ["city"]
-                }
-            ),
-            # 更多工具可以根据需要添加
-        ]
-        
-        return default_tools
+        """返回高德默认工具列表（模块级常量的浅拷贝）"""
+        return list(_DEFAULT_SSE_TOOLS)
     
+    async def _spawn_session(self):
+        """为会话池创建额外的 SSE 会话"""
+        logger.info(f"会话池扩容：建立额外的 SSE 会话 '{self.url}'")
+        return await self.exit_stack.enter_async_context(
+            fused_session(sse_client(self.url))
+        )
+
     async def call_tool(self, tool_name: str, args: Dict[str, Any]) -> Any:
         """调用工具"""
         if not self.session:
             raise RuntimeError("未连接到服务器")
-            
+
+        async def _invoke():
+            # 单会话时绕开池：会话本身支持多请求并发在飞，
+            # 独占取用会把 gather 扇出的调用串行化
+            if self._pool.size == 1:
+                return await self.session.call_tool(tool_name, args)
+            async with self._pool.acquire() as session:
+                return await session.call_tool(tool_name, args)
+
         try:
-            # 现在使用 self.session 而不是 self.sse_session
-            result = await self.session.call_tool(tool_name, args)
+            # 确定性工具的结果按 TTL 缓存，失败不缓存；
+            # 实际调用经会话池执行，支持并发扇出
+            result = await self._tool_cache.get_or_call(
+                self.url, tool_name, args, _invoke
+            )
             return result
         except Exception as e:
             logger.error(f"SSE 工具调用失败: {e}")
-            return {"error": f"工具调用失败: {str(e)}"}
\ No newline at end of file
+            return {"error": f"工具调用失败: {str(e)}"}
+
+    def _extract_content(self, result: Any) -> str:
+        """call_tool 失败时返回错误字典，其余为 MCP 会话结果"""
+        if isinstance(result, dict):
+            return str(result.get("content", result))
+        return str(result.content)
\ No newline at end of file
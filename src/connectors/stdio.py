@@ -1,19 +1,38 @@
 #src/connectors/stdio.py
 from .base import ServerConnection, Tool
+from .tool_cache import ToolCache
+from ._fused import fused_session
+from .pool import SessionPool
 from typing import Dict, Any, List, Optional
 import os
 from contextlib import AsyncExitStack
+from pathlib import Path
 from mcp import StdioServerParameters, ClientSession
 from mcp.client.stdio import stdio_client
 from ..log import logger
 
+# 脚本扩展名 -> 解释器命令，新增扩展名只需加表项
+_COMMAND_BY_EXT = {
+    '.py': 'python',
+    '.js': 'node',
+    '.mjs': 'node',
+}
+
 class StdioConnection(ServerConnection):
     """通过标准输入/输出连接到本地 MCP 服务器脚本或命令"""
-    
+
+    __slots__ = ("_tool_cache", "_tools_cache", "_server_params", "_pool", "_resolved_script")
+
     def __init__(self, config: Dict[str, Any], exit_stack: AsyncExitStack):
         super().__init__(config, exit_stack)
-        self.stdio = None
-        self.write = None
+        # 工具结果缓存，TTL 策略可由配置的 tool_cache 字段覆盖
+        self._tool_cache = ToolCache(ttl_policy=config.get("tool_cache"))
+        # 转换后的工具列表缓存，与 SSEConnection.tools_cache 对应
+        self._tools_cache: Optional[List[Tool]] = None
+        self._server_params: Optional[StdioServerParameters] = None
+        self._pool: Optional[SessionPool] = None
+        # 解析后的脚本绝对路径缓存，重连时跳过路径系统调用
+        self._resolved_script: Optional[Path] = None
         
     async def connect(self) -> ClientSession:
         """连接到本地 MCP 服务器脚本或命令"""
@@ -29,31 +48,32 @@ class StdioConnection(ServerConnection):
     
     async def _connect_script(self) -> ClientSession:
         """连接到本地脚本"""
-        script_path = self.config["script"]
-        
-        # 解析脚本路径（如果是相对路径）
-        if not os.path.isabs(script_path):
-            script_path = os.path.join(
-                os.path.dirname(os.path.dirname(__file__)),
-                self.config.get("directory", "mcp-server"),
-                script_path
-            )
-        
-        # 确保脚本存在
-        if not os.path.exists(script_path):
-            raise FileNotFoundError(f"找不到服务器脚本: {script_path}")
-        
-        # 根据文件扩展名确定命令
-        is_python = script_path.endswith('.py')
-        is_js = script_path.endswith('.js')
-        
-        if not (is_python or is_js):
-            raise ValueError("服务器脚本必须是 .py 或 .js 文件")
-        
-        command = "python" if is_python else "node"
+        # 解析脚本路径（结果缓存；resolve(strict=True) 同时完成
+        # 相对路径拼接与存在性检查）
+        if self._resolved_script is None:
+            path = Path(self.config["script"])
+            if not path.is_absolute():
+                path = (Path(__file__).parent.parent
+                        / self.config.get("directory", "mcp-server")
+                        / path)
+            try:
+                self._resolved_script = path.resolve(strict=True)
+            except FileNotFoundError:
+                raise FileNotFoundError(f"找不到服务器脚本: {path}")
+        script_path = str(self._resolved_script)
+
+        # 根据文件扩展名查表确定命令
+        ext = os.path.splitext(script_path)[1].lower()
+        command = _COMMAND_BY_EXT.get(ext)
+        if command is None:
+            raise ValueError(f"不支持的服务器脚本类型: {ext or script_path}")
+
+        # Python 子进程用 -u 关闭块缓冲：JSON-RPC 帧立即刷出，
+        # 不会在子进程的 8KB stdout 缓冲里滞留
+        args = ["-u", script_path] if command == "python" else [script_path]
         server_params = StdioServerParameters(
             command=command,
-            args=[script_path],
+            args=args,
             env=self._prepare_env()
         )
         
@@ -85,11 +105,18 @@ class StdioConnection(ServerConnection):
     async def _establish_connection(self, server_params: StdioServerParameters) -> ClientSession:
         """建立与子进程的连接"""
         try:
-            stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
-            self.stdio, self.write = stdio_transport
-            self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.write))
-            
-            await self.session.initialize()
+            # 传输与会话融合为单帧进入，退出栈上每个服务器只占一帧
+            self._server_params = server_params
+            self.session = await self.exit_stack.enter_async_context(
+                fused_session(stdio_client(server_params))
+            )
+            # 会话池：pool_size > 1 时并发工具调用可各用一个子进程。
+            # 额外会话在本任务内预先建立——退出栈由本任务关闭，
+            # anyio 取消作用域不允许在别的任务（如 gather 子任务）里进入
+            self._pool = SessionPool()
+            self._pool.seed(self.session)
+            for _ in range(self.config.get("pool_size", 1) - 1):
+                self._pool.seed(await self._spawn_session())
             return self.session
         except Exception as e:
             logger.error(f"建立连接时出错: {e}")
@@ -97,6 +124,13 @@ class StdioConnection(ServerConnection):
                 logger.error(f"命令不存在或不在PATH中: {server_params.command}")
             raise
     
+    async def _spawn_session(self) -> ClientSession:
+        """为会话池创建额外会话（启动一个新的服务器子进程）"""
+        logger.info(f"会话池扩容：启动额外的 '{self._server_params.command}' 子进程")
+        return await self.exit_stack.enter_async_context(
+            fused_session(stdio_client(self._server_params))
+        )
+
     def _prepare_env(self) -> Optional[Dict[str, str]]:
         """准备环境变量"""
         env = None
@@ -105,13 +139,23 @@ class StdioConnection(ServerConnection):
             env = os.environ.copy()
             # 合并配置中的环境变量
             env.update(self.config["env"])
+            # 子进程输出不做块缓冲，避免响应帧滞留（配置可显式覆盖）
+            env.setdefault("PYTHONUNBUFFERED", "1")
         return env
     
+    def invalidate_tools(self) -> None:
+        """作废工具列表缓存（服务器工具集变化时调用）"""
+        self._tools_cache = None
+        self._tool_cache.invalidate()
+
     async def list_tools(self) -> List[Tool]:
-        """获取可用的工具列表"""
+        """获取可用的工具列表（结果缓存，免去逐次 stdio 往返）"""
         if not self.session:
             raise RuntimeError("未连接到服务器")
-            
+
+        if self._tools_cache is not None:
+            return self._tools_cache
+
         response = await self.session.list_tools()
         
         # 将 MCP 返回的工具转换为我们的自定义 Tool 类型
@@ -141,13 +185,28 @@ class StdioConnection(ServerConnection):
                 description=description,
                 inputSchema=schema
             ))
-        
+
+        self._tools_cache = tools
         return tools
     
     async def call_tool(self, tool_name: str, args: Dict[str, Any]) -> Any:
-        """调用工具"""
+        """调用工具（确定性工具的结果按 TTL 缓存，经会话池并发执行）"""
         if not self.session:
             raise RuntimeError("未连接到服务器")
-            
-        result = await self.session.call_tool(tool_name, args)
-        return result
\ No newline at end of file
+
+        async def _invoke():
+            # 单会话时绕开池：会话本身支持多请求并发在飞，
+            # 独占取用会把 gather 扇出的调用串行化
+            if self._pool.size == 1:
+                return await self.session.call_tool(tool_name, args)
+            async with self._pool.acquire() as session:
+                return await session.call_tool(tool_name, args)
+
+        return await self._tool_cache.get_or_call(
+            self.config.get("name") or self.config.get("script", ""),
+            tool_name, args, _invoke
+        )
+
+    def _extract_content(self, result: Any) -> str:
+        """MCP 会话结果的形状已知，直接取 content"""
+        return str(result.content)
\ No newline at end of file
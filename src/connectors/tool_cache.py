@@ -0,0 +1,107 @@
+# src/connectors/tool_cache.py
+"""工具调用结果缓存
+
+LLM 经常对同一参数重复调用确定性工具（如相同地址的 geocode），
+每次都付一个网络/子进程往返纯属浪费。这里提供按
+(服务器, 工具名, 参数) 键控的进程内 LRU+TTL 缓存，并对并发的
+相同调用做 singleflight 去重：同一时刻只有一个真实调用在飞，
+其余等待者共享结果。
+
+未知工具默认不缓存——工具可能有副作用，缓存必须显式开启。
+"""
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# 默认 TTL 策略（秒）：确定性强的工具可长缓存，其余不缓存
+DEFAULT_TTL_POLICY: Dict[str, float] = {
+    "weather": 300,              # 天气 5 分钟内视为不变
+    "geocode": 7 * 24 * 3600,    # 地址 -> 坐标基本不变
+}
+
+class ToolCache:
+    """工具调用结果的 LRU+TTL 缓存（带 singleflight 去重）"""
+
+    __slots__ = ("_maxsize", "_ttl_policy", "_entries", "_inflight")
+
+    def __init__(self, maxsize: int = 256, ttl_policy: Optional[Dict[str, float]] = None):
+        self._maxsize = maxsize
+        self._ttl_policy = dict(DEFAULT_TTL_POLICY if ttl_policy is None else ttl_policy)
+        # key -> (过期时刻, 结果)，dict 的插入序用作 LRU 顺序
+        self._entries: Dict[bytes, tuple] = {}
+        # 在飞调用，等待者共享同一个 Future
+        self._inflight: Dict[bytes, asyncio.Future] = {}
+
+    def ttl_for(self, tool_name: str) -> float:
+        """返回工具的缓存 TTL（秒），0 表示不缓存"""
+        return self._ttl_policy.get(tool_name, 0)
+
+    @staticmethod
+    def make_key(server: str, tool_name: str, args: Dict[str, Any]) -> bytes:
+        """构造缓存键：参数按键排序后哈希，与字典序无关"""
+        payload = json.dumps((server, tool_name, args), sort_keys=True,
+                             ensure_ascii=False, default=str)
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).digest()
+
+    def _get(self, key: bytes) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        # LRU touch：移到插入序末尾
+        del self._entries[key]
+        self._entries[key] = entry
+        return result
+
+    def _put(self, key: bytes, result: Any, ttl: float) -> None:
+        if len(self._entries) >= self._maxsize:
+            # 淘汰最久未使用的条目（插入序首位）
+            self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = (time.monotonic() + ttl, result)
+
+    def invalidate(self) -> None:
+        """清空缓存（服务器工具集变化时调用）"""
+        self._entries.clear()
+
+    async def get_or_call(self,
+                          server: str,
+                          tool_name: str,
+                          args: Dict[str, Any],
+                          call: Callable[[], Awaitable[Any]]) -> Any:
+        """返回缓存结果，未命中时执行 call 并缓存
+
+        TTL 为 0 的工具直接透传；失败的调用不会被缓存。
+        """
+        ttl = self.ttl_for(tool_name)
+        if ttl <= 0:
+            return await call()
+
+        key = self.make_key(server, tool_name, args)
+        cached = self._get(key)
+        if cached is not None:
+            return cached
+
+        # 相同调用已在飞：等待其结果而不是再发一次
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await inflight
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await call()
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # 无等待者时避免 "never retrieved" 警告
+            raise
+        else:
+            self._put(key, result, ttl)
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
@@ -1,16 +1,55 @@
 # src/llm/anthropic.py
-import httpx
-import json
-from typing import Dict, List, Any, Optional
-from .base import LLMProvider
+from typing import Dict, List, Any, AsyncIterator, Optional, Tuple
+from .base import Completion, LLMProvider, _json_dumps, _json_loads
+from ..log import logger
+
+# 消息角色分派表：热循环里一次字典查找代替逐条 if/elif。
+# 连续的工具响应先积累在 state["pending"] 里，
+# 边界处一次 join 合入，避免二次方字符串拼接。
+
+def _flush_tool_fragments(out: List[Dict[str, Any]], state: Dict[str, Any]) -> None:
+    pending = state["pending"]
+    if not pending:
+        return
+    joined = "\n\n".join(pending)
+    pending.clear()
+    # 工具响应附加到最后一条用户消息
+    if out and out[-1]["role"] == "user":
+        out[-1]["content"] += "\n\n" + joined
+    else:
+        out.append({"role": "user", "content": joined})
+
+def _handle_system(msg, out, state):
+    _flush_tool_fragments(out, state)
+    state["system"] = msg["content"]
+
+def _handle_user(msg, out, state):
+    _flush_tool_fragments(out, state)
+    out.append({"role": "user", "content": msg["content"]})
+
+def _handle_assistant(msg, out, state):
+    _flush_tool_fragments(out, state)
+    out.append({"role": "assistant", "content": msg["content"]})
+
+def _handle_tool(msg, out, state):
+    state["pending"].append(f"Tool Response ({msg['name']}): {msg['content']}")
+
+_ROLE_HANDLERS = {
+    "system": _handle_system,
+    "user": _handle_user,
+    "assistant": _handle_assistant,
+    "tool": _handle_tool,
+}
+
+# 负载默认值骨架：键序稳定，利于 CPython 的 dict 键共享
+_PAYLOAD_DEFAULTS = {"max_tokens": 1000}
 
 class AnthropicProvider(LLMProvider):
     """Anthropic Claude API 实现"""
     
     async def initialize(self):
-        self._client = httpx.AsyncClient(
-            base_url=self.base_url or "https://api.anthropic.com/v1",
-            timeout=60.0,
+        self._client = self._get_client(
+            self.base_url or "https://api.anthropic.com/v1",
             headers={
                 "Content-Type": "application/json",
                 "x-api-key": self.api_key,
@@ -18,96 +57,127 @@ class AnthropicProvider(LLMProvider):
             }
         )
     
-    async def generate_completion(self, 
-                                 messages: List[Dict[str, Any]], 
-                                 model: str,
-                                 tools: Optional[List[Dict[str, Any]]] = None, 
-                                 **kwargs) -> Dict[str, Any]:
-        # 将 OpenAI 格式消息转换为 Claude 格式
-        claude_messages = []
-        system_content = ""
-        
+    def set_api_key(self, api_key: str) -> None:
+        """更新 API 密钥并同步预构建的认证头"""
+        super().set_api_key(api_key)
+        if self._client:
+            self._client.headers["x-api-key"] = api_key
+
+    @staticmethod
+    def _convert_messages(messages: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], str]:
+        """将 OpenAI 格式消息转换为 Claude 格式
+
+        角色经模块级分派表处理，未知角色被忽略。
+
+        Returns:
+            (Claude 格式消息列表, 系统消息内容)
+        """
+        claude_messages: List[Dict[str, Any]] = []
+        state: Dict[str, Any] = {"system": "", "pending": []}
+        handlers = _ROLE_HANDLERS
+
         for msg in messages:
-            if msg["role"] == "system":
-                system_content = msg["content"]
-            elif msg["role"] == "user":
-                claude_messages.append({
-                    "role": "user",
-                    "content": msg["content"]
-                })
-            elif msg["role"] == "assistant":
-                claude_messages.append({
-                    "role": "assistant",
-                    "content": msg["content"]
-                })
-            elif msg["role"] == "tool":
-                # 将工具响应附加到最后一条用户消息
-                if claude_messages and claude_messages[-1]["role"] == "user":
-                    claude_messages[-1]["content"] += f"\n\nTool Response ({msg['name']}): {msg['content']}"
-                else:
-                    claude_messages.append({
-                        "role": "user",
-                        "content": f"Tool Response ({msg['name']}): {msg['content']}"
-                    })
-        
+            handler = handlers.get(msg["role"])
+            if handler:
+                handler(msg, claude_messages, state)
+        _flush_tool_fragments(claude_messages, state)
+
+        return claude_messages, state["system"]
+
+    def _build_payload(self,
+                       messages: List[Dict[str, Any]],
+                       model: str,
+                       tools: Optional[List[Dict[str, Any]]],
+                       **kwargs) -> Dict[str, Any]:
+        """构建 /messages 请求体（流式与非流式共用）"""
+        claude_messages, system_content = self._convert_messages(messages)
+
         payload = {
             "model": model,
             "messages": claude_messages,
-            "max_tokens": kwargs.get("max_tokens", 1000)
+            **_PAYLOAD_DEFAULTS
         }
-        
+        if "max_tokens" in kwargs:
+            payload["max_tokens"] = kwargs["max_tokens"]
+
         if system_content:
             payload["system"] = system_content
-        
+
         if tools:
             # 将OpenAI工具格式转换为Claude工具格式
-            claude_tools = []
-            for tool in tools:
-                if tool["type"] == "function":
-                    claude_tools.append({
-                        "name": tool["function"]["name"],
-                        "description": tool["function"].get("description", ""),
-                        "input_schema": tool["function"]["parameters"]
-                    })
-            
+            claude_tools = [{
+                "name": tool["function"]["name"],
+                "description": tool["function"].get("description", ""),
+                "input_schema": tool["function"]["parameters"]
+            } for tool in tools if tool["type"] == "function"]
+
             if claude_tools:
                 payload["tools"] = claude_tools
-        
+
+        return payload
+
+    async def generate_completion(self,
+                                 messages: List[Dict[str, Any]],
+                                 model: str,
+                                 tools: Optional[List[Dict[str, Any]]] = None,
+                                 **kwargs) -> Completion:
+        payload = self._build_payload(messages, model, tools, **kwargs)
+
+        # 请求体预序列化为 bytes，响应用 orjson 解析
         response = await self._client.post(
             "/messages",
-            json=payload
+            content=_json_dumps(payload)
         )
         response.raise_for_status()
-        result = response.json()
-        
-        # 将Claude响应转换回OpenAI格式
-        openai_format = {
-            "choices": [{
-                "message": {
-                    "role": "assistant",
-                    "content": result.get("content", [{"text": ""}])[0].get("text", "")
-                }
-            }]
-        }
-        
+        result = _json_loads(response.content)
+
         # 处理工具调用
-        if "tool_use" in result:
-            tool_calls = []
-            for i, tool_use in enumerate(result.get("tool_use", [])):
-                tool_calls.append({
-                    "id": f"call_{i}",
-                    "type": "function",
-                    "function": {
-                        "name": tool_use["name"],
-                        "arguments": json.dumps(tool_use["input"])
-                    }
-                })
-            
-            if tool_calls:
-                openai_format["choices"][0]["message"]["tool_calls"] = tool_calls
-        
-        return openai_format
-    
+        tool_calls = [{
+            "id": f"call_{i}",
+            "type": "function",
+            "function": {
+                "name": tool_use["name"],
+                "arguments": _json_dumps(tool_use["input"]).decode()
+            }
+        } for i, tool_use in enumerate(result.get("tool_use", []))]
+
+        return Completion(
+            text=result.get("content", [{"text": ""}])[0].get("text", ""),
+            tool_calls=tool_calls
+        )
+
+    async def generate_completion_stream(self,
+                                        messages: List[Dict[str, Any]],
+                                        model: str,
+                                        tools: Optional[List[Dict[str, Any]]] = None,
+                                        **kwargs) -> AsyncIterator[str]:
+        """通过 SSE 流式生成补全，逐块产出增量文本
+
+        使用 Anthropic 的 `"stream": true`，解析 content_block_delta
+        事件，边到达边产出，不缓冲完整响应体。
+        """
+        payload = self._build_payload(messages, model, tools, **kwargs)
+        payload["stream"] = True
+
+        try:
+            async with self._client.stream("POST", "/messages",
+                                           content=_json_dumps(payload)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    event = _json_loads(line[6:])
+                    event_type = event.get("type")
+                    if event_type == "content_block_delta":
+                        text = event.get("delta", {}).get("text")
+                        if text:
+                            yield text
+                    elif event_type == "message_stop":
+                        break
+        except Exception as e:
+            logger.error(f"Anthropic 流式 API 调用失败: {e}")
+            raise
+
     # 其他方法实现...
     def format_system_message(self, content: str) -> Dict[str, Any]:
         return {
@@ -138,8 +208,3 @@ class AnthropicProvider(LLMProvider):
             "content": content
         }
     
-    def extract_text(self, completion: Dict[str, Any]) -> str:
-        return completion["choices"][0]["message"].get("content", "")
-    
-    def extract_tool_calls(self, completion: Dict[str, Any]) -> List[Dict[str, Any]]:
-        return completion["choices"][0]["message"].get("tool_calls", [])
\ No newline at end of file
@@ -1,29 +1,126 @@
 # src/llm/base.py
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, AsyncIterator, Optional
+
+# 优先使用 orjson（C 实现），不可用时回退到标准库 json。
+# _json_dumps 产出 bytes，可直接作为请求体发送，
+# 跳过 httpx 内部的 json.dumps
+try:
+    import orjson
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:
+    import json as _stdlib_json
+
+    def _json_dumps(obj: Any) -> bytes:
+        return _stdlib_json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    _json_loads = _stdlib_json.loads
+
+# 进程级共享的 httpx 客户端，按 (base_url, headers, params) 复用，
+# 重建 provider 时不再重付 TCP/TLS 握手
+_shared_clients: Dict[tuple, Any] = {}
+
+@dataclass(slots=True)
+class Completion:
+    """LLM 补全结果的统一表示
+
+    各 provider 在响应解析时直接填充，调用方经 extract_text /
+    extract_tool_calls 以属性访问读取，省去逐层嵌套 dict 查找。
+    """
+    text: str = ""
+    tool_calls: List[Dict[str, Any]] = field(default_factory=list)
 
 class LLMProvider(ABC):
     """LLM 提供者的抽象基类"""
-    
+
     def __init__(self, api_key: str, base_url: Optional[str] = None):
         self.api_key = api_key
         self.base_url = base_url
         self._client = None
-        
+
     @abstractmethod
     async def initialize(self):
         """初始化 LLM 客户端"""
         pass
+
+    @classmethod
+    def _get_client(cls,
+                    base_url: str,
+                    headers: Optional[Dict[str, str]] = None,
+                    params: Optional[Dict[str, str]] = None,
+                    timeout: float = 60.0):
+        """获取共享的 httpx 客户端（按 base_url/headers/params 缓存）
+
+        同一端点的所有 provider 实例复用同一个连接池，
+        keep-alive 与 HTTP/2 多路复用跨请求生效。
+        """
+        import httpx
+
+        key = (
+            base_url,
+            tuple(sorted((headers or {}).items())),
+            tuple(sorted((params or {}).items())),
+        )
+        client = _shared_clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=base_url,
+                headers=headers,
+                params=params,
+                # 单独收紧连接超时：挂掉的端点 10s 内失败，而非等满整体超时
+                timeout=httpx.Timeout(timeout, connect=10.0),
+                http2=True,
+                limits=httpx.Limits(
+                    max_keepalive_connections=20,
+                    max_connections=100,
+                    keepalive_expiry=30
+                )
+            )
+            _shared_clients[key] = client
+        return client
+
+    @classmethod
+    async def shutdown_all(cls):
+        """关闭所有共享客户端（进程退出时调用一次）"""
+        clients = list(_shared_clients.values())
+        _shared_clients.clear()
+        if clients:
+            await asyncio.gather(*(c.aclose() for c in clients), return_exceptions=True)
+
+    def set_api_key(self, api_key: str) -> None:
+        """更新 API 密钥
+
+        认证头在 initialize 时一次性附加到客户端上，
+        子类覆盖此方法以同步已构建客户端的认证信息。
+        """
+        self.api_key = api_key
     
     @abstractmethod
-    async def generate_completion(self, 
-                                 messages: List[Dict[str, Any]], 
+    async def generate_completion(self,
+                                 messages: List[Dict[str, Any]],
                                  model: str,
-                                 tools: Optional[List[Dict[str, Any]]] = None, 
-                                 **kwargs) -> Dict[str, Any]:
+                                 tools: Optional[List[Dict[str, Any]]] = None,
+                                 **kwargs) -> Completion:
         """生成文本补全"""
         pass
     
+    async def generate_completion_stream(self,
+                                        messages: List[Dict[str, Any]],
+                                        model: str,
+                                        tools: Optional[List[Dict[str, Any]]] = None,
+                                        **kwargs) -> AsyncIterator[str]:
+        """流式生成文本补全，逐块产出增量文本
+
+        默认实现回退为一次性生成后整体产出，子类可覆盖为真正的流式。
+        """
+        completion = await self.generate_completion(messages, model, tools=tools, **kwargs)
+        text = self.extract_text(completion)
+        if text:
+            yield text
+
     @abstractmethod
     def format_system_message(self, content: str) -> Dict[str, Any]:
         """格式化系统消息"""
@@ -44,17 +141,18 @@ class LLMProvider(ABC):
         """格式化工具消息"""
         pass
     
-    @abstractmethod
-    def extract_text(self, completion: Dict[str, Any]) -> str:
-        """从补全响应中提取文本"""
-        pass
-    
-    @abstractmethod
-    def extract_tool_calls(self, completion: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """从补全响应中提取工具调用"""
-        pass
+    def extract_text(self, completion: Completion) -> str:
+        """从补全结果中提取文本"""
+        return completion.text
+
+    def extract_tool_calls(self, completion: Completion) -> List[Dict[str, Any]]:
+        """从补全结果中提取工具调用"""
+        return completion.tool_calls
     
     async def close(self):
-        """关闭客户端"""
-        if hasattr(self, '_client') and self._client:
-            await self._client.aclose()
\ No newline at end of file
+        """释放对客户端的引用
+
+        客户端本身是进程级共享的，不在此关闭，
+        由 :meth:`shutdown_all` 在进程退出时统一关闭。
+        """
+        self._client = None
\ No newline at end of file
@@ -1,96 +1,122 @@
 # src/llm/factory.py
-from typing import Dict, Optional, Type
+import functools
+import importlib
+import re
+import urllib.parse
+from typing import Any, Dict, Optional, Type
 from .base import LLMProvider
-from .openai import OpenAIProvider
-from .anthropic import AnthropicProvider
-from .google import GoogleProvider
 from ..log import logger
 
+# 模型名前缀与官方端点域名的调度表及预编译正则，
+# 单次正则匹配代替逐项 Python 循环
+_MODEL_PREFIX_PROVIDER = {
+    "gpt": "openai",
+    "claude": "anthropic",
+    "gemini": "google",
+    "text-bison": "google",
+    "palm": "google"
+}
+_MODEL_PREFIX_RE = re.compile(
+    r"^(" + "|".join(map(re.escape, _MODEL_PREFIX_PROVIDER)) + r")",
+    re.IGNORECASE
+)
+
+# 官方端点按域名标签做精确后缀匹配，
+# 子串包含（如 evilapi.openai.com.attacker）不再误判
+_HOST_SUFFIX_TO_PROVIDER = {
+    "api.openai.com": "openai",
+    "api.anthropic.com": "anthropic",
+    "claude.ai": "anthropic",
+    "generativelanguage.googleapis.com": "google",
+    "ai.googleapis.com": "google"
+}
+
+def _provider_for_host(hostname: str) -> Optional[str]:
+    """按域名后缀精确匹配官方端点，O(标签数) 次字典查找"""
+    host = hostname.partition(":")[0]  # 去掉端口
+    while host:
+        provider = _HOST_SUFFIX_TO_PROVIDER.get(host)
+        if provider:
+            return provider
+        _, _, host = host.partition(".")
+    return None
+
+@functools.lru_cache(maxsize=128)
+def _resolve_provider_name(model_name: str, base_url: Optional[str]) -> str:
+    """解析 (模型名, base_url) 对应的提供者名称（结果缓存）"""
+    # 1. 如果有 base_url，优先按端点判断
+    if base_url:
+        try:
+            hostname = urllib.parse.urlparse(base_url).netloc.lower()
+            provider = _provider_for_host(hostname)
+            if provider:
+                logger.info(f"使用官方端点 {hostname} 对应的 {provider} 提供者")
+                return provider
+            # 非官方端点默认使用 OpenAI 提供者，
+            # 大多数代理服务都使用 OpenAI 兼容的 API 格式
+            logger.info(f"使用非官方端点 {hostname}，默认以 OpenAI 兼容接口处理")
+            return "openai"
+        except Exception as e:
+            logger.warning(f"解析 base_url 时出错: {e}，回退到基于模型名称的选择")
+
+    # 2. 没有 base_url 或解析失败时，按模型名前缀选择
+    match = _MODEL_PREFIX_RE.match(model_name)
+    if match:
+        provider = _MODEL_PREFIX_PROVIDER[match.group(1).lower()]
+        logger.info(f"根据模型名 {model_name} 选择 {provider} 提供者")
+        return provider
+
+    # 3. 默认使用 OpenAI 提供者
+    logger.info(f"无法确定提供者，默认使用 OpenAI 提供者处理模型 {model_name}")
+    return "openai"
+
 class LLMFactory:
     """LLM 提供者工厂"""
     
-    _registry: Dict[str, Type[LLMProvider]] = {
-        "openai": OpenAIProvider,
-        "anthropic": AnthropicProvider,
-        "google": GoogleProvider
-    }
-    
-    # 官方 API 端点
-    _official_endpoints = {
-        "openai": ["api.openai.com"],
-        "anthropic": ["api.anthropic.com", "claude.ai"],
-        "google": ["generativelanguage.googleapis.com", "ai.googleapis.com"]
+    # 名称 -> (模块, 类名) 或已注册的类；
+    # 内置 provider 模块在首次使用时才导入
+    _registry: Dict[str, Any] = {
+        "openai": (".openai", "OpenAIProvider"),
+        "anthropic": (".anthropic", "AnthropicProvider"),
+        "google": (".google", "GoogleProvider")
     }
-    
+
+    # 已解析的提供者类缓存
+    _loaded: Dict[str, Type[LLMProvider]] = {}
+
     @classmethod
     def register(cls, name: str, provider_class: Type[LLMProvider]) -> None:
         """注册新的 LLM 提供者"""
         cls._registry[name] = provider_class
-    
+        cls._loaded.pop(name, None)
+
+    @staticmethod
+    async def shutdown_clients() -> None:
+        """关闭所有 provider 共享的 HTTP 客户端（进程退出时调用）"""
+        await LLMProvider.shutdown_all()
+
     @classmethod
     def create(cls, provider_name: str, api_key: str, base_url: Optional[str] = None) -> LLMProvider:
         """创建 LLM 提供者实例"""
-        if provider_name not in cls._registry:
-            raise ValueError(f"未知的 LLM 提供者: {provider_name}")
-        
-        provider_class = cls._registry[provider_name]
+        provider_class = cls._loaded.get(provider_name)
+        if provider_class is None:
+            spec = cls._registry.get(provider_name)
+            if spec is None:
+                raise ValueError(f"未知的 LLM 提供者: {provider_name}")
+            if isinstance(spec, tuple):
+                module = importlib.import_module(spec[0], __package__)
+                provider_class = getattr(module, spec[1])
+            else:
+                provider_class = spec
+            cls._loaded[provider_name] = provider_class
+
         return provider_class(api_key, base_url)
     
     @classmethod
     def get_provider_for_model(cls, model_name: str, api_key: str, base_url: Optional[str] = None) -> LLMProvider:
-        """根据模型名称和基础 URL 选择合适的提供者"""
-        import urllib.parse
-        
-        # 基于模型名称的初步映射
-        model_prefix_map = {
-            "gpt": "openai",
-            "claude": "anthropic",
-            "gemini": "google",
-            "text-bison": "google",
-            "palm": "google"
-        }
-        
-        # 1. 确定初始提供者候选(基于模型名)
-        provider_candidate = None
-        for prefix, provider in model_prefix_map.items():
-            if model_name.lower().startswith(prefix):
-                provider_candidate = provider
-                break
-        
-        # 2. 如果有 base_url，检查是否是官方端点
-        if base_url:
-            try:
-                # 解析 base_url 获取 hostname
-                parsed_url = urllib.parse.urlparse(base_url)
-                hostname = parsed_url.netloc.lower()
-                
-                # 检查是否匹配任何官方端点
-                is_official_endpoint = False
-                matched_provider = None
-                
-                for provider, domains in cls._official_endpoints.items():
-                    if any(domain in hostname for domain in domains):
-                        is_official_endpoint = True
-                        matched_provider = provider
-                        break
-                
-                if is_official_endpoint:
-                    # 如果是官方端点，使用对应的提供者
-                    logger.info(f"使用官方端点 {hostname} 对应的 {matched_provider} 提供者")
-                    return cls.create(matched_provider, api_key, base_url)
-                else:
-                    # 如果不是官方端点，默认使用 OpenAI 提供者
-                    # 这是因为大多数代理服务都使用 OpenAI 兼容的 API 格式
-                    logger.info(f"使用非官方端点 {hostname}，默认以 OpenAI 兼容接口处理")
-                    return cls.create("openai", api_key, base_url)
-            except Exception as e:
-                logger.warning(f"解析 base_url 时出错: {e}，回退到基于模型名称的选择")
-        
-        # 3. 如果没有 base_url 或解析失败，使用基于模型名称的选择
-        if provider_candidate:
-            logger.info(f"根据模型名 {model_name} 选择 {provider_candidate} 提供者")
-            return cls.create(provider_candidate, api_key, base_url)
-        
-        # 4. 默认使用 OpenAI 提供者
-        logger.info(f"无法确定提供者，默认使用 OpenAI 提供者处理模型 {model_name}")
-        return cls.create("openai", api_key, base_url)
\ No newline at end of file
+        """根据模型名称和基础 URL 选择合适的提供者
+
+        名称解析结果按 (model_name, base_url) 缓存，
+        重复调用只剩一次字典查找加实例构造。
+        """
+        return cls.create(_resolve_provider_name(model_name, base_url), api_key, base_url)
\ No newline at end of file
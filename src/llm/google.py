@@ -1,103 +1,168 @@
-import httpx
-import json
-from typing import Dict, List, Any, Optional
-from .base import LLMProvider
+from typing import Dict, List, Any, AsyncIterator, Optional
+from .base import Completion, LLMProvider, _json_dumps, _json_loads
+from ..log import logger
+
+# 消息角色分派表：热循环里一次字典查找代替逐条 if/elif。
+# 连续的工具输出先积累在 state["pending"] 里，
+# 边界处一次 join 合入，避免二次方字符串拼接。
+
+def _flush_tool_fragments(out: List[Dict[str, Any]], state: Dict[str, Any]) -> None:
+    pending = state["pending"]
+    if not pending:
+        return
+    joined = "\n\n".join(pending)
+    pending.clear()
+    # 工具输出添加到用户消息中
+    if out and out[-1]["role"] == "user":
+        out[-1]["parts"][0]["text"] += "\n\n" + joined
+    else:
+        out.append({"role": "user", "parts": [{"text": joined}]})
+
+def _handle_system(msg, out, state):
+    _flush_tool_fragments(out, state)
+    # Gemini 使用特殊的系统消息格式
+    out.append({
+        "role": "user",
+        "parts": [{"text": f"[SYSTEM]{msg['content']}[/SYSTEM]"}]
+    })
+
+def _handle_user(msg, out, state):
+    _flush_tool_fragments(out, state)
+    out.append({"role": "user", "parts": [{"text": msg["content"]}]})
+
+def _handle_assistant(msg, out, state):
+    _flush_tool_fragments(out, state)
+    out.append({"role": "model", "parts": [{"text": msg["content"]}]})
+
+def _handle_tool(msg, out, state):
+    state["pending"].append(f"Tool Output ({msg['name']}): {msg['content']}")
+
+_ROLE_HANDLERS = {
+    "system": _handle_system,
+    "user": _handle_user,
+    "assistant": _handle_assistant,
+    "tool": _handle_tool,
+}
+
+# 生成配置默认值骨架：键序稳定，利于 CPython 的 dict 键共享
+_GENERATION_DEFAULTS = {"temperature": 0.7, "maxOutputTokens": 1000}
 
 class GoogleProvider(LLMProvider):
     """Google Gemini API 实现"""
     
     async def initialize(self):
         """初始化 Google API 客户端"""
-        self._client = httpx.AsyncClient(
-            base_url=self.base_url or "https://generativelanguage.googleapis.com/v1beta",
-            timeout=60.0,
+        self._client = self._get_client(
+            self.base_url or "https://generativelanguage.googleapis.com/v1beta",
+            headers={"Content-Type": "application/json"},
             params={"key": self.api_key}
         )
     
-    async def generate_completion(self, 
-                                 messages: List[Dict[str, Any]], 
-                                 model: str,
-                                 tools: Optional[List[Dict[str, Any]]] = None, 
-                                 **kwargs) -> Dict[str, Any]:
-        """调用 Gemini API 生成回复"""
-        # 将 OpenAI 格式转换为 Gemini 格式
-        gemini_messages = []
-        
+    def set_api_key(self, api_key: str) -> None:
+        """更新 API 密钥并同步客户端的查询参数"""
+        super().set_api_key(api_key)
+        if self._client:
+            self._client.params = self._client.params.merge({"key": api_key})
+
+    @staticmethod
+    def _convert_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """将 OpenAI 格式消息转换为 Gemini 格式
+
+        角色经模块级分派表处理，未知角色被忽略。
+        """
+        gemini_messages: List[Dict[str, Any]] = []
+        state: Dict[str, Any] = {"pending": []}
+        handlers = _ROLE_HANDLERS
+
         for msg in messages:
-            if msg["role"] == "system":
-                # Gemini 使用特殊的系统消息格式
-                gemini_messages.append({
-                    "role": "user",
-                    "parts": [{"text": f"[SYSTEM]{msg['content']}[/SYSTEM]"}]
-                })
-            elif msg["role"] == "user":
-                gemini_messages.append({
-                    "role": "user",
-                    "parts": [{"text": msg["content"]}]
-                })
-            elif msg["role"] == "assistant":
-                gemini_messages.append({
-                    "role": "model",
-                    "parts": [{"text": msg["content"]}]
-                })
-            elif msg["role"] == "tool":
-                # 工具响应添加到用户消息中
-                if gemini_messages and gemini_messages[-1]["role"] == "user":
-                    gemini_messages[-1]["parts"][0]["text"] += f"\n\nTool Output ({msg['name']}): {msg['content']}"
-                else:
-                    gemini_messages.append({
-                        "role": "user",
-                        "parts": [{"text": f"Tool Output ({msg['name']}): {msg['content']}"}]
-                    })
+            handler = handlers.get(msg["role"])
+            if handler:
+                handler(msg, gemini_messages, state)
+        _flush_tool_fragments(gemini_messages, state)
+
+        return gemini_messages
+
+    def _build_payload(self,
+                       messages: List[Dict[str, Any]],
+                       tools: Optional[List[Dict[str, Any]]],
+                       **kwargs) -> Dict[str, Any]:
+        """构建 generateContent 请求体（流式与非流式共用）"""
+        generation_config = dict(_GENERATION_DEFAULTS)
+        if "temperature" in kwargs:
+            generation_config["temperature"] = kwargs["temperature"]
+        if "max_tokens" in kwargs:
+            generation_config["maxOutputTokens"] = kwargs["max_tokens"]
 
-        # 构建API请求
         payload = {
-            "contents": gemini_messages,
-            "generationConfig": {
-                "temperature": kwargs.get("temperature", 0.7),
-                "maxOutputTokens": kwargs.get("max_tokens", 1000)
-            }
+            "contents": self._convert_messages(messages),
+            "generationConfig": generation_config
         }
-        
+
         # 添加工具支持（如果提供）
         if tools:
-            function_declarations = []
-            for tool in tools:
-                if tool["type"] == "function":
-                    function_declarations.append({
-                        "name": tool["function"]["name"],
-                        "description": tool["function"].get("description", ""),
-                        "parameters": tool["function"]["parameters"]
-                    })
-            
+            function_declarations = [{
+                "name": tool["function"]["name"],
+                "description": tool["function"].get("description", ""),
+                "parameters": tool["function"]["parameters"]
+            } for tool in tools if tool["type"] == "function"]
+
             if function_declarations:
                 payload["tools"] = [{"functionDeclarations": function_declarations}]
-        
-        # 发送请求
+
+        return payload
+
+    async def generate_completion(self,
+                                 messages: List[Dict[str, Any]],
+                                 model: str,
+                                 tools: Optional[List[Dict[str, Any]]] = None,
+                                 **kwargs) -> Completion:
+        """调用 Gemini API 生成回复"""
+        payload = self._build_payload(messages, tools, **kwargs)
+
+        # 发送请求（请求体预序列化为 bytes，响应用 orjson 解析）
         response = await self._client.post(
             f"/models/{model}:generateContent",
-            json=payload
+            content=_json_dumps(payload)
         )
         response.raise_for_status()
-        result = response.json()
-        
-        # 将 Google 响应转换为 OpenAI 格式
-        openai_response = {
-            "choices": [{
-                "message": {
-                    "role": "assistant",
-                    "content": self._extract_gemini_content(result)
-                }
-            }]
-        }
-        
-        # 处理函数调用
-        function_calls = self._extract_function_calls(result)
-        if function_calls:
-            openai_response["choices"][0]["message"]["tool_calls"] = function_calls
-        
-        return openai_response
-    
+        result = _json_loads(response.content)
+
+        return Completion(
+            text=self._extract_gemini_content(result),
+            tool_calls=self._extract_function_calls(result)
+        )
+
+    async def generate_completion_stream(self,
+                                        messages: List[Dict[str, Any]],
+                                        model: str,
+                                        tools: Optional[List[Dict[str, Any]]] = None,
+                                        **kwargs) -> AsyncIterator[str]:
+        """通过 SSE 流式生成补全，逐块产出增量文本
+
+        使用 `:streamGenerateContent?alt=sse`，边到达边产出，
+        不缓冲完整响应体。
+        """
+        payload = self._build_payload(messages, tools, **kwargs)
+
+        try:
+            async with self._client.stream(
+                "POST",
+                f"/models/{model}:streamGenerateContent",
+                params={"alt": "sse"},
+                content=_json_dumps(payload)
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    chunk = _json_loads(line[6:])
+                    text = self._extract_gemini_content(chunk)
+                    if text:
+                        yield text
+        except Exception as e:
+            logger.error(f"Gemini 流式 API 调用失败: {e}")
+            raise
+
     def _extract_gemini_content(self, response: Dict[str, Any]) -> str:
         """从 Gemini 响应中提取文本内容"""
         try:
@@ -134,7 +199,7 @@ class GoogleProvider(LLMProvider):
                         "type": "function",
                         "function": {
                             "name": function_call.get("name", ""),
-                            "arguments": json.dumps(function_call.get("args", {}))
+                            "arguments": _json_dumps(function_call.get("args", {})).decode()
                         }
                     })
         except Exception:
@@ -175,10 +240,3 @@ class GoogleProvider(LLMProvider):
             "content": content
         }
     
-    def extract_text(self, completion: Dict[str, Any]) -> str:
-        """从补全响应中提取文本"""
-        return completion["choices"][0]["message"].get("content", "")
-    
-    def extract_tool_calls(self, completion: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """从补全响应中提取工具调用"""
-        return completion["choices"][0]["message"].get("tool_calls", [])
\ No newline at end of file
@@ -1,22 +1,70 @@
 # src/llm/openai.py
-import httpx
-import json
-from typing import Dict, List, Any, Optional
-from .base import LLMProvider
+from typing import Dict, List, Any, AsyncIterator, Optional
+from .base import Completion, LLMProvider, _json_dumps, _json_loads
 from ..log import logger
 
+def _describe_payload(payload: Dict[str, Any]) -> str:
+    """生成请求体的摘要字符串（仅在 DEBUG 级别真正输出时才被调用）"""
+    summary = payload.copy()
+    if "messages" in summary:
+        summary["messages"] = f"[{len(summary['messages'])} messages]"
+    if "tools" in summary:
+        summary["tools"] = f"[{len(summary['tools'])} tools]"
+    return _json_dumps(summary).decode()
+
+# 工具修正结果的单槽缓存：[原 tools 列表, 修正结果]。
+# 对话循环通常复用同一个 tools 列表，按对象身份命中即可省掉整个修正循环；
+# 持有强引用，身份比较不会碰到被 GC 复用的 id
+_tools_fix_memo: List[Any] = [None, None]
+
+def _fix_tools(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """检查并修正工具定义格式（按列表身份记忆化）
+
+    定义已合规时直接引用原 dict（常见情况零拷贝），
+    只在确实需要修正时才复制工具及其 function 子字典。
+    """
+    memo = _tools_fix_memo
+    if memo[0] is tools:
+        return memo[1]
+
+    fixed_tools = []
+    for tool in tools:
+        function = tool.get("function")
+        params = function.get("parameters") if function else None
+        if function is None or params is None or \
+                (isinstance(params, dict) and "type" in params):
+            fixed_tools.append(tool)
+            continue
+
+        fixed_tool = dict(tool)
+        fixed_tool["function"] = function = dict(function)
+        # 确保 parameters 是一个有效的 JSON Schema
+        if not isinstance(params, dict):
+            logger.warning(f"工具 '{function.get('name', 'unknown')}' 的参数不是有效的字典")
+            params = {}
+        logger.info(f"添加默认类型到工具 '{function.get('name', 'unknown')}' 的参数")
+        function["parameters"] = {
+            "type": "object",
+            "properties": params.copy(),
+            "required": []
+        }
+        fixed_tools.append(fixed_tool)
+
+    memo[0] = tools
+    memo[1] = fixed_tools
+    return fixed_tools
+
 class OpenAIProvider(LLMProvider):
     """OpenAI API 实现"""
     
     async def initialize(self):
         """初始化 OpenAI 客户端"""
-        self._client = httpx.AsyncClient(
-            base_url=self.base_url or "https://api.openai.com/v1",
+        self._client = self._get_client(
+            self.base_url or "https://api.openai.com/v1",
             headers={
                 "Authorization": f"Bearer {self.api_key}",
                 "Content-Type": "application/json"
-            },
-            timeout=60.0
+            }
         )
         
         # 尝试检测正在使用的 API 类型
@@ -24,7 +72,7 @@ class OpenAIProvider(LLMProvider):
             response = await self._client.get("/models")
             
             if response.status_code == 200:
-                models = response.json().get("data", [])
+                models = _json_loads(response.content).get("data", [])
                 model_ids = [model.get("id") for model in models]
                 
                 # 记录可用模型
@@ -43,11 +91,17 @@ class OpenAIProvider(LLMProvider):
             from ..log import logger
             logger.debug(f"API 类型检测失败: {e}")
     
-    async def generate_completion(self, 
-                                 messages: List[Dict[str, Any]], 
+    def set_api_key(self, api_key: str) -> None:
+        """更新 API 密钥并同步预构建的认证头"""
+        super().set_api_key(api_key)
+        if self._client:
+            self._client.headers["Authorization"] = f"Bearer {api_key}"
+
+    async def generate_completion(self,
+                                 messages: List[Dict[str, Any]],
                                  model: str,
-                                 tools: Optional[List[Dict[str, Any]]] = None, 
-                                 **kwargs) -> Dict[str, Any]:
+                                 tools: Optional[List[Dict[str, Any]]] = None,
+                                 **kwargs) -> Completion:
         
         payload = {
             "model": model,
@@ -56,59 +110,33 @@ class OpenAIProvider(LLMProvider):
         }
         
         if tools:
-            # 检查并修正工具定义格式
-            fixed_tools = []
-            for tool in tools:
-                fixed_tool = tool.copy()
-                if "function" in fixed_tool:
-                    # 确保 parameters 是一个有效的 JSON Schema
-                    if "parameters" in fixed_tool["function"]:
-                        params = fixed_tool["function"]["parameters"]
-                        if not isinstance(params, dict):
-                            logger.warning(f"工具 '{fixed_tool['function'].get('name', 'unknown')}' 的参数不是有效的字典")
-                            params = {}
-                        
-                        if "type" not in params:
-                            logger.info(f"添加默认类型到工具 '{fixed_tool['function'].get('name', 'unknown')}' 的参数")
-                            params = {
-                                "type": "object",
-                                "properties": params.copy(),
-                                "required": []
-                            }
-                            fixed_tool["function"]["parameters"] = params
-                fixed_tools.append(fixed_tool)
-            
-            payload["tools"] = fixed_tools
+            payload["tools"] = _fix_tools(tools)
             payload["tool_choice"] = "auto"
         
-        # 记录请求详情 (消息内容和工具太长，截断显示)
-        log_payload = payload.copy()
-        if "messages" in log_payload:
-            log_payload["messages"] = f"[{len(messages)} messages]"
-        if "tools" in log_payload:
-            for i, tool in enumerate(log_payload["tools"]):
-                if i < 3:  # 只显示前3个工具
-                    logger.debug(f"工具 {i+1}: {json.dumps(tool, ensure_ascii=False)}")
-                else:
-                    logger.debug(f"还有 {len(log_payload['tools']) - 3} 个工具未显示")
-            log_payload["tools"] = f"[{len(log_payload['tools'])} tools]"
-        
-        logger.debug(f"OpenAI API 请求: {json.dumps(log_payload, ensure_ascii=False)}")
-        
+        # 记录请求详情（消息和工具太长，截断显示；
+        # 摘要与工具定义的序列化惰性求值，INFO 级别下零开销）
+        logger.opt(lazy=True).debug("OpenAI API 请求: {}",
+                                    lambda: _describe_payload(payload))
+
         try:
             # 记录完整的原始请求
             if tools:
-                logger.debug("完整工具定义:")
-                logger.debug(json.dumps(payload["tools"], ensure_ascii=False, indent=2))
-            
+                logger.opt(lazy=True).debug("完整工具定义: {}",
+                                            lambda: _json_dumps(payload["tools"]).decode())
+
+            # 请求体预序列化为 bytes，跳过 httpx 内部的 json.dumps
             response = await self._client.post(
                 "/chat/completions",
-                json=payload
+                content=_json_dumps(payload)
             )
             response.raise_for_status()
-            result = response.json()
+            result = _json_loads(response.content)
             logger.debug(f"OpenAI API 响应状态码: {response.status_code}")
-            return result
+            message = result["choices"][0]["message"]
+            return Completion(
+                text=message.get("content") or "",
+                tool_calls=message.get("tool_calls") or []
+            )
         except Exception as e:
             logger.error(f"OpenAI API 调用失败: {e}")
             logger.error(f"请求 URL: {self.base_url}/chat/completions")
@@ -120,33 +148,70 @@ class OpenAIProvider(LLMProvider):
                     err_text = e.response.text
                     logger.error(f"错误响应原文: {err_text}")
                     
-                    err_json = e.response.json()
-                    logger.error(f"错误详情: {json.dumps(err_json, ensure_ascii=False, indent=2)}")
+                    err_json = _json_loads(e.response.content)
+                    logger.error(f"错误详情: {_json_dumps(err_json).decode()}")
                 except:
                     pass
                 
-                # 记录完整的错误请求体
+                # 记录出错请求携带的工具定义：整体序列化一次并截断，
+                # 不再逐工具、逐参数重复遍历同一棵树
                 try:
-                    # 完整记录请求体，特别关注工具定义
                     if tools:
-                        for i, tool in enumerate(tools):
-                            logger.error(f"工具 {i+1} 定义: {json.dumps(tool, ensure_ascii=False)}")
-                            
-                            # 特别检查参数部分
-                            if "function" in tool and "parameters" in tool["function"]:
-                                params = tool["function"]["parameters"]
-                                logger.error(f"工具 {i+1} 参数: {json.dumps(params, ensure_ascii=False)}")
+                        tools_json = _json_dumps(payload.get("tools", tools)).decode()
+                        logger.error(f"工具定义: {tools_json[:4096]}")
                 except:
                     pass
             
             raise
     
+    async def generate_completion_stream(self,
+                                        messages: List[Dict[str, Any]],
+                                        model: str,
+                                        tools: Optional[List[Dict[str, Any]]] = None,
+                                        **kwargs) -> AsyncIterator[str]:
+        """通过 SSE 流式生成补全，逐块产出增量文本
+
+        使用 OpenAI 兼容的 `"stream": true`，边到达边产出，
+        首 token 延迟只有一个 RTT，且不缓冲完整响应体。
+        """
+        payload = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": kwargs.get("max_tokens", 1000),
+            "stream": True
+        }
+
+        if tools:
+            payload["tools"] = tools
+            payload["tool_choice"] = "auto"
+
+        try:
+            async with self._client.stream("POST", "/chat/completions",
+                                           content=_json_dumps(payload)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    data = line[6:]
+                    if data == "[DONE]":
+                        break
+                    chunk = _json_loads(data)
+                    choices = chunk.get("choices", [])
+                    if not choices:
+                        continue
+                    content = choices[0].get("delta", {}).get("content")
+                    if content:
+                        yield content
+        except Exception as e:
+            logger.error(f"OpenAI 流式 API 调用失败: {e}")
+            raise
+
     def format_system_message(self, content: str) -> Dict[str, Any]:
         return {
             "role": "system",
             "content": content
         }
-    
+
     def format_user_message(self, content: str) -> Dict[str, Any]:
         return {
             "role": "user",
@@ -170,8 +235,3 @@ class OpenAIProvider(LLMProvider):
             "content": content
         }
     
-    def extract_text(self, completion: Dict[str, Any]) -> str:
-        return completion["choices"][0]["message"].get("content", "")
-    
-    def extract_tool_calls(self, completion: Dict[str, Any]) -> List[Dict[str, Any]]:
-        return completion["choices"][0]["message"].get("tool_calls", [])
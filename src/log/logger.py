@@ -22,17 +22,22 @@ def setup_logger(log_level="INFO", log_dir="logs"):
     logger.add(
         sys.stderr,
         level=log_level,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+        format="<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | <level>{message}</level>"
     )
     
     # 添加文件处理器
+    # enqueue=True 把格式化和磁盘写入移到后台线程，
+    # 事件循环不再被文件 I/O 或每日轮换的 zip 压缩阻塞
     logger.add(
         os.path.join(log_dir, "mcp-{time:YYYY-MM-DD}.log"),
         rotation="00:00",  # 每天轮换
         retention="7 days",  # 保留7天
         level=log_level,
         compression="zip",
-        format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{line} - {message}"
+        enqueue=True,
+        backtrace=False,
+        diagnose=False,
+        format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {message}"
     )
     
     return logger
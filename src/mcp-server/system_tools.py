@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 """System Tools MCP Server - 执行系统程序和应用程序自动化"""
 
+import asyncio
 import os
 import sys
 import subprocess
-import time
-import json
+import fnmatch
 import shlex
 from typing import Dict, List, Any, Optional
 from datetime import datetime
@@ -13,6 +13,13 @@ import shutil
 import platform
 from mcp.server.fastmcp import FastMCP
 
+# 优先使用 psutil 直接取进程信息（C 级系统调用），
+# 未安装时回退到 tasklist/ps 子进程解析
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
 # 初始化 FastMCP server
 mcp = FastMCP("system_tools")
 
@@ -55,6 +62,107 @@ ALLOWED_APPS = {
     }
 }
 
+# 白名单与禁止目录在导入时一次性预处理成小写集合/元组，
+# 每次检查只剩 O(1) 集合成员测试加一次 C 级前缀匹配
+_ALLOWED_PATHS_LC = frozenset(
+    p.lower()
+    for info in ALLOWED_APPS.values()
+    for p in (info["path"], *info["alt_paths"])
+)
+
+_PROHIBITED_PREFIXES_LC = tuple(d.lower() for d in (
+    r"C:\\Windows\\System32\\drivers",
+    r"C:\\Windows\\System32\\config",
+    r"C:\\Windows\\security",
+    r"/boot", "/etc", "/var"  # Linux路径(以防万一)
+))
+
+# 写入/删除的禁止目录前缀（小写），单次 startswith(tuple) 测完全部
+_FORBIDDEN_WRITE_LC = tuple(d.lower() for d in (
+    r"C:\Windows\System32",
+    r"C:\Windows\System",
+    r"C:\Program Files",
+    r"C:\Program Files (x86)",
+    "/etc", "/var/lib", "/bin", "/sbin"  # Linux系统目录
+))
+
+_FORBIDDEN_DELETE_LC = tuple(d.lower() for d in (
+    r"C:\Windows",
+    r"C:\Program Files",
+    r"C:\Program Files (x86)",
+    "/etc", "/var/lib", "/bin", "/sbin"
+))
+
+def _win32_send_paste_enter(text: str) -> bool:
+    """Windows 下写剪贴板并用单次 SendInput 批量注入 Ctrl+V、Enter
+
+    一次系统调用发送整个按键序列，省去 pyperclip/pyautogui
+    逐键模拟的内部 sleep 和逐次 Win32 调用；
+    非 Windows 或失败时返回 False，由调用方回退。
+    """
+    if platform.system() != "Windows":
+        return False
+    try:
+        import ctypes
+
+        user32 = ctypes.windll.user32
+        kernel32 = ctypes.windll.kernel32
+
+        # 剪贴板写入 CF_UNICODETEXT
+        CF_UNICODETEXT = 13
+        GMEM_MOVEABLE = 0x0002
+        buf = ctypes.create_unicode_buffer(text)
+        size = ctypes.sizeof(buf)
+        if not user32.OpenClipboard(None):
+            return False
+        try:
+            user32.EmptyClipboard()
+            handle = kernel32.GlobalAlloc(GMEM_MOVEABLE, size)
+            locked = kernel32.GlobalLock(handle)
+            ctypes.memmove(locked, buf, size)
+            kernel32.GlobalUnlock(handle)
+            user32.SetClipboardData(CF_UNICODETEXT, handle)
+        finally:
+            user32.CloseClipboard()
+
+        PUL = ctypes.POINTER(ctypes.c_ulong)
+
+        class KEYBDINPUT(ctypes.Structure):
+            _fields_ = [("wVk", ctypes.c_ushort), ("wScan", ctypes.c_ushort),
+                        ("dwFlags", ctypes.c_ulong), ("time", ctypes.c_ulong),
+                        ("dwExtraInfo", PUL)]
+
+        class MOUSEINPUT(ctypes.Structure):
+            _fields_ = [("dx", ctypes.c_long), ("dy", ctypes.c_long),
+                        ("mouseData", ctypes.c_ulong), ("dwFlags", ctypes.c_ulong),
+                        ("time", ctypes.c_ulong), ("dwExtraInfo", PUL)]
+
+        class INPUT_UNION(ctypes.Union):
+            _fields_ = [("mi", MOUSEINPUT), ("ki", KEYBDINPUT)]
+
+        class INPUT(ctypes.Structure):
+            _fields_ = [("type", ctypes.c_ulong), ("union", INPUT_UNION)]
+
+        INPUT_KEYBOARD = 1
+        KEYEVENTF_KEYUP = 0x0002
+        VK_CONTROL, VK_V, VK_RETURN = 0x11, 0x56, 0x0D
+
+        def key(vk, flags=0):
+            inp = INPUT(type=INPUT_KEYBOARD)
+            inp.union.ki = KEYBDINPUT(wVk=vk, wScan=0, dwFlags=flags,
+                                      time=0, dwExtraInfo=None)
+            return inp
+
+        events = (INPUT * 6)(
+            key(VK_CONTROL), key(VK_V), key(VK_V, KEYEVENTF_KEYUP),
+            key(VK_CONTROL, KEYEVENTF_KEYUP),
+            key(VK_RETURN), key(VK_RETURN, KEYEVENTF_KEYUP)
+        )
+        sent = user32.SendInput(6, events, ctypes.sizeof(INPUT))
+        return sent == 6
+    except Exception:
+        return False
+
 def find_executable(app_name: str) -> Optional[str]:
     """查找应用程序可执行文件路径"""
     if app_name in ALLOWED_APPS:
@@ -78,27 +186,18 @@ def find_executable(app_name: str) -> Optional[str]:
 
 def is_allowed_executable(path: str) -> bool:
     """检查是否是允许执行的程序"""
+    path_lc = path.lower()
+
     # 检查是否在白名单中
-    for app_info in ALLOWED_APPS.values():
-        if path.lower() == app_info["path"].lower():
-            return True
-        if path.lower() in [alt_path.lower() for alt_path in app_info["alt_paths"]]:
-            return True
-    
+    if path_lc in _ALLOWED_PATHS_LC:
+        return True
+
     # 添加一些基本的安全检查
-    prohibited_dirs = [
-        r"C:\\Windows\\System32\\drivers",
-        r"C:\\Windows\\System32\\config",
-        r"C:\\Windows\\security",
-        r"/boot", "/etc", "/var"  # Linux路径(以防万一)
-    ]
-    
-    for dir_path in prohibited_dirs:
-        if path.lower().startswith(dir_path.lower()):
-            return False
-    
+    if path_lc.startswith(_PROHIBITED_PREFIXES_LC):
+        return False
+
     # 允许其他目录的常规应用程序
-    return path.lower().endswith('.exe')
+    return path_lc.endswith('.exe')
 
 @mcp.tool()
 async def execute_program(program: str, arguments: Optional[str] = None, 
@@ -142,8 +241,7 @@ async def execute_program(program: str, arguments: Optional[str] = None,
         
         # 设置工作目录
         if working_directory:
-            if not os.path.exists(working_directory):
-                os.makedirs(working_directory, exist_ok=True)
+            os.makedirs(working_directory, exist_ok=True)
             cwd = working_directory
         else:
             cwd = os.getcwd()  # 使用当前目录
@@ -159,8 +257,8 @@ async def execute_program(program: str, arguments: Optional[str] = None,
             errors='replace'
         )
         
-        # 等待一小段时间，确保进程启动
-        time.sleep(0.5)
+        # 等待一小段时间，确保进程启动（不阻塞事件循环）
+        await asyncio.sleep(0.5)
         
         # 检查进程状态
         return_code = process.poll()
@@ -233,18 +331,29 @@ async def send_qq_message(qq_number: str, message: str) -> Dict[str, Any]:
         qq_running = False
         
         try:
-            # 使用tasklist检查QQ进程
-            if platform.system() == "Windows":
-                output = subprocess.check_output("tasklist /FI \"IMAGENAME eq QQ.exe\"", shell=True, text=True)
-                qq_running = "QQ.exe" in output
+            if psutil is not None:
+                # 内核级进程快照枚举，免去 cmd.exe+tasklist 子进程
+                qq_running = any(
+                    (p.info['name'] or '').lower() == 'qq.exe'
+                    for p in psutil.process_iter(['name'])
+                )
+            elif platform.system() == "Windows":
+                # 使用tasklist检查QQ进程（异步子进程，不阻塞事件循环）
+                proc = await asyncio.create_subprocess_shell(
+                    "tasklist /FI \"IMAGENAME eq QQ.exe\"",
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL
+                )
+                stdout, _ = await proc.communicate()
+                qq_running = b"QQ.exe" in stdout
         except:
             qq_running = False
-        
+
         # 如果QQ没有运行，启动它
         if not qq_running:
             subprocess.Popen([qq_path], shell=False)
             # 等待QQ启动
-            time.sleep(5)
+            await asyncio.sleep(5)
         
         # 2. 使用QQ的URL协议启动聊天窗口
         # QQ的URL协议: tencent://message/?Menu=yes&uin=QQ号码&Service=300&sigT=45a1e5847943b64c6ff3990f8a9e644d2b31356cb0b4ac6b24663a3c8dd0f8aa12a595b1464e7f6ae49b170252
@@ -257,17 +366,24 @@ async def send_qq_message(qq_number: str, message: str) -> Dict[str, Any]:
             subprocess.Popen(['xdg-open', qq_url], shell=False)
         
         # 3. 等待聊天窗口打开
-        time.sleep(2)
+        await asyncio.sleep(2)
         
-        # 4. 模拟复制消息到剪贴板
+        # 4/5. 优先走 Win32：剪贴板 + 单次 SendInput 批量按键
+        if _win32_send_paste_enter(message):
+            return {
+                "success": True,
+                "message": f"已向QQ {qq_number} 发送消息"
+            }
+
+        # 回退：模拟复制消息到剪贴板
         import pyperclip
         pyperclip.copy(message)
-        
-        # 5. 模拟按键 Ctrl+V 和 Enter
+
+        # 模拟按键 Ctrl+V 和 Enter
         try:
             import pyautogui
             pyautogui.hotkey('ctrl', 'v')
-            time.sleep(0.5)
+            await asyncio.sleep(0.5)
             pyautogui.press('enter')
             
             return {
@@ -299,7 +415,19 @@ async def list_running_processes() -> Dict[str, Any]:
     """
     try:
         processes = []
-        
+
+        if psutil is not None:
+            # 直接枚举进程，免去子进程 fork+exec 和文本解析
+            for proc in psutil.process_iter(['pid', 'name', 'username',
+                                             'cpu_percent', 'memory_percent']):
+                processes.append(proc.info)
+                if len(processes) >= 100:
+                    break
+            return {
+                "success": True,
+                "processes": processes
+            }
+
         if platform.system() == "Windows":
             output = subprocess.check_output("tasklist /FO CSV /NH", shell=True, text=True)
             for line in output.strip().split('\n'):
@@ -400,30 +528,23 @@ async def create_file(file_path: str, content: str) -> Dict[str, Any]:
     """
     try:
         # 安全检查：不允许写入系统目录
-        forbidden_dirs = [
-            r"C:\Windows\System32",
-            r"C:\Windows\System",
-            r"C:\Program Files",
-            r"C:\Program Files (x86)",
-            "/etc", "/var/lib", "/bin", "/sbin"  # Linux系统目录
-        ]
-        
         abs_path = os.path.abspath(file_path)
-        for forbidden in forbidden_dirs:
-            if abs_path.lower().startswith(forbidden.lower()):
-                return {
-                    "success": False,
-                    "error": f"安全限制：不允许写入系统目录 '{forbidden}'"
-                }
+        if abs_path.lower().startswith(_FORBIDDEN_WRITE_LC):
+            return {
+                "success": False,
+                "error": f"安全限制：不允许写入系统目录 '{abs_path}'"
+            }
         
-        # 如果路径不存在，创建目录
+        # 确保父目录存在（exist_ok 免去一次预检 stat）
         dir_path = os.path.dirname(abs_path)
-        if dir_path and not os.path.exists(dir_path):
-            os.makedirs(dir_path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
         
-        # 写入文件
-        with open(abs_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        # 写入文件：预编码一次后按字节写出，
+        # 跳过 TextIOWrapper 的分块再编码
+        data = content.encode('utf-8')
+        with open(abs_path, 'wb') as f:
+            f.write(data)
         
         return {
             "success": True,
@@ -450,33 +571,34 @@ async def read_file(file_path: str, max_size: int = 1024*1024) -> Dict[str, Any]
         包含文件内容的字典
     """
     try:
-        # 检查文件是否存在
-        if not os.path.exists(file_path):
+        # 一次性读入字节（多读 1 字节用于检测超限），
+        # 编码探测退化为纯内存的 decode 尝试；
+        # 直接打开而不预检存在性，少一次 stat 且无 TOCTOU 窗口
+        try:
+            with open(file_path, 'rb') as f:
+                raw = f.read(max_size + 1)
+        except FileNotFoundError:
             return {
                 "success": False,
                 "error": f"文件不存在：{file_path}"
             }
-        
-        # 检查文件大小
-        file_size = os.path.getsize(file_path)
+
+        file_size = len(raw)
         if file_size > max_size:
             return {
                 "success": False,
-                "error": f"文件过大：{file_size} 字节（限制：{max_size} 字节）"
+                "error": f"文件过大：超过限制 {max_size} 字节"
             }
-        
-        # 尝试不同编码读取文件
-        encodings = ['utf-8', 'gbk', 'latin1']
+
+        # 尝试不同编码解码内容
         content = None
-        
-        for encoding in encodings:
+        for encoding in ('utf-8', 'gbk', 'latin1'):
             try:
-                with open(file_path, 'r', encoding=encoding) as f:
-                    content = f.read()
+                content = raw.decode(encoding)
                 break
             except UnicodeDecodeError:
                 continue
-        
+
         if content is None:
             # 如果所有文本编码都失败，可能是二进制文件
             return {
@@ -510,41 +632,37 @@ async def list_files(directory: str = ".", pattern: str = "*") -> Dict[str, Any]
         包含文件列表的字典
     """
     try:
-        import glob
-        import time
-        from datetime import datetime
-        
-        # 确保目录存在
-        if not os.path.exists(directory):
+        # 获取绝对路径
+        abs_dir = os.path.abspath(directory)
+
+        # 用 scandir 枚举：DirEntry 缓存了目录项自带的 stat 信息，
+        # 免去每个文件单独的 stat/isdir 系统调用；
+        # 目录不存在由 scandir 直接报错，省去预检
+        file_info = []
+        try:
+            with os.scandir(abs_dir) as it:
+                for entry in it:
+                    if not fnmatch.fnmatch(entry.name, pattern):
+                        continue
+                    try:
+                        stat = entry.stat()
+                        file_info.append({
+                            "name": entry.name,
+                            "path": entry.path,
+                            "size": stat.st_size,
+                            "is_dir": entry.is_dir(),
+                            "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                            "created": datetime.fromtimestamp(stat.st_ctime).isoformat()
+                        })
+                    except:
+                        # 跳过无法访问的文件
+                        pass
+        except (FileNotFoundError, NotADirectoryError):
             return {
                 "success": False,
                 "error": f"目录不存在：{directory}"
             }
         
-        # 获取绝对路径
-        abs_dir = os.path.abspath(directory)
-        
-        # 查找文件
-        file_pattern = os.path.join(abs_dir, pattern)
-        files = glob.glob(file_pattern)
-        
-        # 收集文件信息
-        file_info = []
-        for file_path in files:
-            try:
-                stat = os.stat(file_path)
-                file_info.append({
-                    "name": os.path.basename(file_path),
-                    "path": file_path,
-                    "size": stat.st_size,
-                    "is_dir": os.path.isdir(file_path),
-                    "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                    "created": datetime.fromtimestamp(stat.st_ctime).isoformat()
-                })
-            except:
-                # 跳过无法访问的文件
-                pass
-        
         return {
             "success": True,
             "directory": abs_dir,
@@ -572,40 +690,31 @@ async def delete_file(file_path: str) -> Dict[str, Any]:
     """
     try:
         # 安全检查：不允许删除系统目录中的文件
-        forbidden_dirs = [
-            r"C:\Windows", 
-            r"C:\Program Files", 
-            r"C:\Program Files (x86)",
-            "/etc", "/var/lib", "/bin", "/sbin"
-        ]
-        
         abs_path = os.path.abspath(file_path)
-        for forbidden in forbidden_dirs:
-            if abs_path.lower().startswith(forbidden.lower()):
-                return {
-                    "success": False,
-                    "error": f"安全限制：不允许删除系统目录中的文件 '{forbidden}'"
-                }
-        
-        # 检查文件是否存在
-        if not os.path.exists(abs_path):
+        if abs_path.lower().startswith(_FORBIDDEN_DELETE_LC):
             return {
                 "success": False,
-                "error": f"文件不存在：{abs_path}"
+                "error": f"安全限制：不允许删除系统目录中的文件 '{abs_path}'"
             }
         
-        # 删除文件
-        if os.path.isdir(abs_path):
-            os.rmdir(abs_path)  # 只删除空目录
-            return {
-                "success": True,
-                "message": f"目录已删除：{abs_path}"
-            }
-        else:
-            os.remove(abs_path)
+        # 直接删除，不预检存在性（少一次 stat 且无 TOCTOU 窗口）
+        try:
+            if os.path.isdir(abs_path):
+                os.rmdir(abs_path)  # 只删除空目录
+                return {
+                    "success": True,
+                    "message": f"目录已删除：{abs_path}"
+                }
+            else:
+                os.remove(abs_path)
+                return {
+                    "success": True,
+                    "message": f"文件已删除：{abs_path}"
+                }
+        except FileNotFoundError:
             return {
-                "success": True,
-                "message": f"文件已删除：{abs_path}"
+                "success": False,
+                "error": f"文件不存在：{abs_path}"
             }
     except Exception as e:
         return {
@@ -647,8 +756,6 @@ async def run_python_code(code: str) -> Dict[str, Any]:
         包含执行结果的字典
     """
     try:
-        import tempfile
-        import sys
         from io import StringIO
         
         # 安全检查：不允许一些危险操作
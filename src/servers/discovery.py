@@ -1,35 +1,95 @@
 import os
-from typing import Dict, List, Any
+import re
+from typing import Dict, Iterator, List, Any, Optional
 import pathlib
 
-def find_server_instances(config: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
-    """从配置中获取服务器实例
-    
-    Args:
-        config: 配置字典
-        
-    Returns:
-        服务器实例字典，键为服务器名称，值为服务器配置
+# MCP 服务器标记的多模式正则：一次扫描代替三次独立子串查找；
+# 按字节匹配，省去整个文件的 utf-8 解码
+_MCP_MARKER = re.compile(rb'FastMCP|\.mcp|MCP\(')
+
+# 进程内发现结果缓存：键为 (目录绝对路径, 目录 mtime_ns)。
+# 重复发现（启动、重载）在目录未变时只付一次 stat
+_disc_cache: Dict[tuple, Dict[str, str]] = {}
+
+class LazyServerMap:
+    """按需发现服务器实例的延迟映射
+
+    配置中预定义的实例立即可用；目录扫描推迟到首次需要时
+    （没有预定义实例且发生名称查找或完整枚举），避免启动时
+    为从未使用的服务器付出文件系统开销。
     """
-    servers = {}
-    
-    # 检查配置中是否有预定义的服务器实例
-    if "servers" in config and "instances" in config["servers"]:
-        for instance in config["servers"]["instances"]:
-            servers[instance["name"]] = instance
-    
-    # 如果没有预定义实例或实例为空，尝试从目录查找
-    if not servers:
-        file_servers = find_server_files(config["servers"].get("directory", "../mcp-server"))
+
+    def __init__(self, config: Dict[str, Any]):
+        self._config = config
+        self._servers: Dict[str, Dict[str, Any]] = {}
+
+        # 检查配置中是否有预定义的服务器实例
+        if "servers" in config and "instances" in config["servers"]:
+            for instance in config["servers"]["instances"]:
+                self._servers[instance["name"]] = instance
+
+        # 有预定义实例时无需目录扫描
+        self._scanned = bool(self._servers)
+        self._default: Optional[str] = None
+
+    def _ensure_scanned(self) -> None:
+        """目录扫描（只执行一次）"""
+        if self._scanned:
+            return
+        self._scanned = True
+
+        file_servers = find_server_files(self._config["servers"].get("directory", "../mcp-server"))
         for name, path in file_servers.items():
-            servers[name] = {
+            self._servers.setdefault(name, {
                 "name": name,
                 "type": "stdio",
                 "script": path,
                 "description": f"从文件发现的服务器: {name}"
-            }
-    
-    return servers
+            })
+
+    def get_default(self) -> Optional[str]:
+        """获取默认服务器名称（配置的 default 或第一个可用服务器，结果缓存）"""
+        if self._default is None:
+            default = self._config.get("servers", {}).get("default")
+            if default and default in self:
+                self._default = default
+            else:
+                self._default = next(iter(self), None)
+        return self._default
+
+    def __getitem__(self, name: str) -> Dict[str, Any]:
+        if name not in self._servers:
+            self._ensure_scanned()
+        return self._servers[name]
+
+    def __contains__(self, name: object) -> bool:
+        if name in self._servers:
+            return True
+        self._ensure_scanned()
+        return name in self._servers
+
+    def __iter__(self) -> Iterator[str]:
+        self._ensure_scanned()
+        return iter(self._servers)
+
+    def __len__(self) -> int:
+        self._ensure_scanned()
+        return len(self._servers)
+
+    def keys(self):
+        self._ensure_scanned()
+        return self._servers.keys()
+
+def find_server_instances(config: Dict[str, Any]) -> LazyServerMap:
+    """从配置中获取服务器实例
+
+    Args:
+        config: 配置字典
+
+    Returns:
+        服务器实例的延迟映射，键为服务器名称，值为服务器配置
+    """
+    return LazyServerMap(config)
 
 def find_server_files(directory: str) -> Dict[str, str]:
     """在指定目录中查找所有可用的 MCP 服务器脚本文件
@@ -41,32 +101,36 @@ def find_server_files(directory: str) -> Dict[str, str]:
         字典，键为服务器名称，值为脚本路径
     """
     servers = {}
-    
+
     # 解决相对路径问题
     if not os.path.isabs(directory):
         # 相对于 mcp-server 目录
         directory = os.path.join(os.path.dirname(__file__), '..', 'mcp-server', directory)
-    
-    # 确保目录存在
-    if not os.path.exists(directory):
+
+    # 进程内缓存：目录 mtime 未变时直接返回上次的结果；
+    # 目录不存在由 stat 直接报错，免去单独的 exists 预检。
+    # 不落盘索引——往目录里写索引文件本身会更新目录 mtime，
+    # 使按 mtime 键控的磁盘缓存永远失效
+    abs_directory = os.path.abspath(directory)
+    try:
+        dir_mtime_ns = os.stat(directory).st_mtime_ns
+    except FileNotFoundError:
         print(f"警告：目录 '{directory}' 不存在")
         return {}
-    
-    # 遍历目录中的所有文件
-    for filename in os.listdir(directory):
-        filepath = os.path.join(directory, filename)
-        
-        # 检查是否是 Python 文件
-        if filename.endswith('.py') and os.path.isfile(filepath):
-            # 使用文件名（不带扩展名）作为服务器名称
-            server_name = os.path.splitext(filename)[0]
-            servers[server_name] = filepath
-            
-        # 检查是否是 JavaScript 文件
-        elif filename.endswith('.js') and os.path.isfile(filepath):
-            server_name = os.path.splitext(filename)[0]
-            servers[server_name] = filepath
-    
+    mem_key = (abs_directory, dir_mtime_ns)
+    cached_servers = _disc_cache.get(mem_key)
+    if cached_servers is not None:
+        return cached_servers
+
+    # 遍历目录（scandir 的 DirEntry 缓存 stat 结果，避免逐文件 stat）
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_file(follow_symlinks=False) and entry.name.endswith(('.py', '.js')):
+                # 使用文件名（不带扩展名）作为服务器名称
+                server_name = os.path.splitext(entry.name)[0]
+                servers[server_name] = entry.path
+
+    _disc_cache[mem_key] = servers
     return servers
 
 def validate_server(server_path: str) -> bool:
@@ -78,18 +142,23 @@ def validate_server(server_path: str) -> bool:
     Returns:
         是否是有效的 MCP 服务器
     """
-    # 简单检查文件是否包含 FastMCP 或相关关键字
-    if not os.path.exists(server_path):
-        return False
-        
+    # 简单检查文件是否包含 FastMCP 或相关关键字；
+    # 文件不存在走 open 的异常路径，不做预检
     try:
-        with open(server_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        # 检查是否包含 FastMCP 或 MCP 关键字
-        if 'FastMCP' in content or '.mcp' in content or 'MCP(' in content:
-            return True
+        # 分块读取并在命中时立即返回：标记几乎总在文件头部的
+        # import 区，通常只需读第一块；保留上一块的尾部拼接，
+        # 避免标记恰好横跨块边界时漏检
+        with open(server_path, 'rb') as f:
+            tail = b''
+            while True:
+                chunk = f.read(8192)
+                if not chunk:
+                    break
+                # 检查是否包含 FastMCP 或 MCP 关键字（单次正则扫描）
+                if _MCP_MARKER.search(tail + chunk):
+                    return True
+                tail = chunk[-16:]
     except Exception:
         pass
-    
+
     return False
\ No newline at end of file